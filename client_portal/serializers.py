@@ -1,18 +1,37 @@
+from inventory.models import WineItem
+
 
 class WineItemSerializer:
-    def __init__(self, item):
-        self.id = item.id                    # WineItem ID
-        self.name = item.inventory.wine.name
-        self.vintage = item.inventory.wine.vintage
-        self.category = item.inventory.wine.category
-        self.region = item.inventory.wine.region
-        self.appellation = item.inventory.wine.appellation
-        self.bottle_size = item.inventory.bottle_size
-        self.offer_price = item.offer_price  # Price offered to client
-        self.offer_qty = item.offer_qty  # Quantity offered to client
-        self.note = item.note
-        self.accept_qty = item.accept_qty  # Quantity ordered by client
+    """
+    One wine list line as shown to clients: a slotted record filled from a
+    single joined query, so lists with thousands of lines stay cheap.
+    """
+
+    # Record field -> WineItem lookup it is read from
+    LOOKUPS = {
+        'id': 'id',                          # WineItem ID
+        'name': 'inventory__wine__name',
+        'vintage': 'inventory__wine__vintage',
+        'category': 'inventory__wine__category',
+        'region': 'inventory__wine__region',
+        'appellation': 'inventory__wine__appellation',
+        'bottle_size': 'inventory__bottle_size',
+        'offer_price': 'offer_price',        # Price offered to client
+        'offer_qty': 'offer_qty',            # Quantity offered to client
+        'note': 'note',
+        'accept_qty': 'accept_qty',          # Quantity ordered by client
+    }
+    __slots__ = tuple(LOOKUPS)
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def for_wine_list(cls, wine_list):
+        """All lines of `wine_list`, in list order, with one query."""
+        rows = WineItem.objects.filter(wine_list=wine_list).values_list(*cls.LOOKUPS.values())
+        return [cls(*row) for row in rows.iterator(chunk_size=2000)]
 
     def to_dict(self):
-        return self.__dict__
-    
+        return {field: getattr(self, field) for field in self.__slots__}
@@ -1,3 +1,134 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from inventory.models import Wine, WineInventory, WineItem, WineList
+
+
+class ClientWineListPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.wine = Wine.objects.create(name='Margaux', vintage='2015', category='red')
+        lot = WineInventory.objects.create(wine=self.wine, purchase_price=Decimal('100'), qty=6, bottle_size=75)
+        self.wine_list = WineList.objects.create(name='Client A')
+        self.item = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=lot, offer_price=Decimal('120'), offer_qty=3)
+        self.url = reverse('client_wine_list', args=[self.wine_list.uuid])
+
+    def test_page_has_an_etag(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Margaux')
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_item_change_gives_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.wine_list.amend_items([{'item_id': self.item.pk, 'accept_qty': 1}])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_revalidation_is_one_query(self):
+        response = self.client.get(self.url)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_wine_edit_gives_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.wine.name = 'Chateau Margaux'
+        self.wine.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Chateau Margaux')
+
+    def test_batch_edit_gives_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        staff = get_user_model().objects.create_user('staff', password='secret')
+        self.client.force_login(staff)
+        # Set-based updates of the wine behind the item, not of the item itself
+        self.client.post(reverse('batch_edit_wines'), {
+            'selected_wines': str(self.item.inventory_id), 'region': 'Bordeaux'})
+        self.client.logout()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Bordeaux')
+
+    def test_language_is_part_of_the_etag(self):
+        english = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='en')['ETag']
+
+        response = self.client.get(self.url, HTTP_ACCEPT_LANGUAGE='fr', HTTP_IF_NONE_MATCH=english)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], english)
+
+    def test_archived_list_is_not_found(self):
+        WineList.objects.filter(pk=self.wine_list.pk).update(status='archived')
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ClientWineListJsonTests(TestCase):
+
+    def setUp(self):
+        self.wine_list = WineList.objects.create(name='Client A')
+        for name in ('Margaux', 'Pauillac'):
+            wine = Wine.objects.create(name=name, vintage='2015', category='red', region='Bordeaux')
+            lot = WineInventory.objects.create(wine=wine, purchase_price=Decimal('100'), qty=6, bottle_size=75)
+            WineItem.objects.create(wine_list=self.wine_list, inventory=lot, offer_price=Decimal('120'), offer_qty=3)
+        self.url = reverse('client_wine_list_json', args=[self.wine_list.uuid])
+
+    def test_list_and_items(self):
+        # The list, then every line with its wine in one joined query
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        payload = response.json()
+        self.assertTrue(payload['success'])
+        self.assertEqual(payload['wine_list'], {
+            'uuid': str(self.wine_list.uuid), 'name': 'Client A', 'status': 'created',
+            'status_display': self.wine_list.get_status_display(), 'item_count': 2, 'items_value': '720.00',
+        })
+        self.assertEqual(sorted(item['name'] for item in payload['items']), ['Margaux', 'Pauillac'])
+        self.assertEqual(payload['items'][0], {
+            'id': payload['items'][0]['id'], 'name': payload['items'][0]['name'], 'vintage': '2015',
+            'category': 'red', 'region': 'Bordeaux', 'appellation': None, 'bottle_size': 75,
+            'offer_price': '120.00', 'offer_qty': 3, 'note': None, 'accept_qty': None,
+        })
+
+    def test_archived_list_is_not_found(self):
+        WineList.objects.filter(pk=self.wine_list.pk).update(status='archived')
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
 
-# Create your tests here.
+    def test_only_get(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
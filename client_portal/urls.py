@@ -7,5 +7,6 @@ urlpatterns = [
 
     # path("winelist/", views.wine_list_view, name="client_wine_list"),
     path("winelist/<uuid:uuid>/", views.wine_list_view, name="client_wine_list"),
+    path("winelist/<uuid:uuid>.json", views.wine_list_json_view, name="client_wine_list_json"),
     path("winelist/<uuid:uuid>/submit/", views.submit_wine_list, name='client_submit_wine_list'),
 ]
@@ -1,4 +1,5 @@
 import pandas as pd
+import hashlib
 import json
 import uuid
 
@@ -6,13 +7,18 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.translation import gettext as _
 from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db import transaction
+from django.db.models import Max
 from django.http import HttpResponse, JsonResponse
 
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
 from inventory.models import Wine, WineInventory, STATUS_CHOICES, WineItem, WineList
 from client_portal.serializers import WineItemSerializer
@@ -79,15 +85,76 @@ def index(request):
 #     # GET request - show the search form
 #     return render(request, 'index.html')
 
+def _page_version(uuid):
+    """
+    ETag value and last-modified time of a client wine list page, from one
+    aggregate query; 404 if the list is missing or archived.
+
+    Writes to the list move its updated_at, item writes the newest item
+    timestamp or item_count, and writes to the lots behind the items (imports,
+    batch edits, and edits of their wines, see inventory.signals) the newest
+    lot timestamp, so any change to what the page shows gives a new ETag.
+    """
+    updated_at, items_updated, lots_updated, item_count = get_object_or_404(
+        WineList.objects.exclude(status='archived')
+        .annotate(items_updated=Max('items__updated_at'), lots_updated=Max('items__inventory__updated_at'))
+        .values_list('updated_at', 'items_updated', 'lots_updated', 'item_count'),
+        uuid=uuid,
+    )
+    stamps = (updated_at, items_updated, lots_updated)
+    version = "|".join(stamp.isoformat() if stamp else "" for stamp in stamps)
+    tag = hashlib.sha1(f"{version}|{item_count}|{translation.get_language()}".encode()).hexdigest()[:20]
+    return tag, max(stamp for stamp in stamps if stamp is not None)
+
+
 def wine_list_view(request, uuid):
+    tag, last_modified = _page_version(uuid)
+    etag = f'"{tag}"'
+    timestamp = int(last_modified.timestamp())
+
+    # Browsers revalidate with If-None-Match / If-Modified-Since: answer 304 without
+    # loading the items or rendering
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        # Keyed by the ETag (which covers the language), so a changed list misses the stale entry
+        key = f"client_wine_list:{uuid}:{tag}"
+        content = cache.get(key)
+        if content is None:
+            wine_list = get_object_or_404(
+                WineList.objects.exclude(status='archived'), uuid=uuid)
+            display_items = WineItemSerializer.for_wine_list(wine_list)
+
+            content = render(request, "client_portal/wine_list.html", {
+                "wine_list": wine_list,
+                "display_items": display_items
+            }).content
+            cache.set(key, content, settings.CLIENT_PAGE_CACHE_SECONDS)
+        response = HttpResponse(content)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_GET
+def wine_list_json_view(request, uuid):
+    """The wine list page as JSON, for the clients' mobile apps."""
     wine_list = get_object_or_404(
         WineList.objects.exclude(status='archived'), uuid=uuid)
-    items = wine_list.items.all()
-    display_items = [WineItemSerializer(item) for item in items]
-
-    return render(request, "client_portal/wine_list.html", {
-        "wine_list": wine_list,
-        "display_items": display_items
+    items = WineItemSerializer.for_wine_list(wine_list)
+
+    return JsonResponse({
+        "success": True,
+        "wine_list": {
+            "uuid": wine_list.uuid,
+            "name": wine_list.name,
+            "status": wine_list.status,
+            "status_display": wine_list.get_status_display(),
+            "item_count": wine_list.item_count,
+            "items_value": wine_list.items_value,
+        },
+        "items": [item.to_dict() for item in items],
     })
 
 
@@ -96,11 +163,6 @@ def submit_wine_list(request, uuid):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Invalid method"}, status=405)
 
-    wine_list = get_object_or_404(WineList, uuid=uuid)
-
-    if wine_list.status != "created":
-        return JsonResponse({"success": False, "error": "Wine list has already been submitted"}, status=400)
-
     try:
         data = json.loads(request.body)
         items_data = data.get("items", [])
@@ -110,25 +172,18 @@ def submit_wine_list(request, uuid):
     if not items_data:
         return JsonResponse({"success": False, "error": "No items provided"}, status=400)
 
-    # Update each item
-    for item_info in items_data:
-        item_id = item_info.get("item_id")
-        accept_qty = item_info.get("accept_qty", 0)
-
-        if not item_id or accept_qty < 0:
-            continue  # skip invalid
-
-        try:
-            wine_item = WineItem.objects.get(id=item_id, wine_list=wine_list)
-            wine_item.accept_qty = min(
-                accept_qty, wine_item.offer_qty)  # don't exceed offer
-            wine_item.save()
-        except WineItem.DoesNotExist:
-            continue  # skip missing
-
-    # Update wine list status
-    wine_list.status = "submitted"
-    wine_list.save()
+    with transaction.atomic():
+        # Lock the list so two submissions cannot both see it still open
+        wine_list = get_object_or_404(WineList.objects.select_for_update(), uuid=uuid)
+
+        if wine_list.status != "created":
+            return JsonResponse({"success": False, "error": "Wine list has already been submitted"}, status=400)
+
+        wine_list.amend_items(items_data)
+
+        # Update wine list status; the stored totals were just shifted in the database
+        wine_list.status = "submitted"
+        wine_list.save(update_fields=["status", "updated_at"])
     return JsonResponse({"success": True})
 
 
@@ -137,11 +192,6 @@ def amend_wine_list(request, uuid):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Invalid method"}, status=405)
 
-    wine_list = get_object_or_404(WineList, uuid=uuid)
-
-    if wine_list.status != "created":
-        return JsonResponse({"success": False, "error": "Wine list has already been submitted"}, status=400)
-
     try:
         data = json.loads(request.body)
         items_data = data.get("items", [])
@@ -151,22 +201,16 @@ def amend_wine_list(request, uuid):
     if not items_data:
         return JsonResponse({"success": False, "error": "No items provided"}, status=400)
 
-    # Update each item
-    for item_info in items_data:
-        item_id = item_info.get("item_id")
-        accept_qty = item_info.get("accept_qty", 0)
+    with transaction.atomic():
+        # Lock the list so two submissions cannot both see it still open
+        wine_list = get_object_or_404(WineList.objects.select_for_update(), uuid=uuid)
 
-        if not item_id or accept_qty < 0:
-            continue  # skip invalid
+        if wine_list.status != "created":
+            return JsonResponse({"success": False, "error": "Wine list has already been submitted"}, status=400)
 
-        try:
-            wine_item = WineItem.objects.get(id=item_id, wine_list=wine_list)
-            wine_item.accept_qty = min(accept_qty, wine_item.offer_qty)  # don't exceed offer
-            wine_item.save()
-        except WineItem.DoesNotExist:
-            continue  # skip missing
+        wine_list.amend_items(items_data)
 
-    # Update wine list status
-    wine_list.status = "submitted"
-    wine_list.save()
+        # Update wine list status; the stored totals were just shifted in the database
+        wine_list.status = "submitted"
+        wine_list.save(update_fields=["status", "updated_at"])
     return JsonResponse({"success": True})
@@ -0,0 +1,227 @@
+"""
+Near-duplicate Wine detection and merging (see the find_duplicate_wines command).
+
+Wines are blocked by canonical vintage and canonical-name prefix, so only wines
+that could be the same are ever compared. Within a block every name becomes a
+hashed-trigram vector and all pairs are scored at once with one matrix product
+(Dice coefficient of the trigram sets). Names with different numbers in them
+("Cuvee No 1" vs "Cuvee No 2") are never duplicates. Blocks larger than max_block are split
+on a longer prefix, which keeps each product small.
+"""
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, Value, When
+from django.utils import timezone
+
+from .models import Wine, WineInventory, WineItem
+from .naming import canonical_name, canonical_vintage, trigrams
+
+TRIGRAM_BUCKETS = 1024
+SIMILARITY_THRESHOLD = 0.85
+
+
+def _blocks(members, names, prefix, max_block):
+    """Yield lists of indices sharing a name prefix, at most max_block long."""
+    by_prefix = defaultdict(list)
+    for index in members:
+        by_prefix[names[index][:prefix]].append(index)
+    for block in by_prefix.values():
+        if len(block) < 2:
+            continue
+        if len(block) <= max_block:
+            yield block
+        elif any(len(names[index]) > prefix for index in block):
+            yield from _blocks(block, names, prefix + 2, max_block)
+        else:
+            # Identical canonical names beyond max_block: score them in slices
+            for start in range(0, len(block), max_block):
+                yield block[start:start + max_block]
+
+
+def _numbers(name):
+    return hash(tuple(word for word in name.split() if word.isdigit()))
+
+
+def _similar_pairs(block, buckets, numbers, threshold):
+    """(i, j, score) for every pair of the block scoring at least threshold."""
+    vectors = np.zeros((len(block), TRIGRAM_BUCKETS), dtype=np.float32)
+    rows = np.repeat(np.arange(len(block)), [len(buckets[index]) for index in block])
+    vectors[rows, np.concatenate([buckets[index] for index in block])] = 1
+
+    sizes = vectors.sum(axis=1)
+    overlap = vectors @ vectors.T
+    scores = 2 * overlap / np.maximum(sizes[:, None] + sizes[None, :], 1)
+    block_numbers = numbers[block]
+    same_numbers = block_numbers[:, None] == block_numbers[None, :]
+    first, second = np.nonzero(np.triu((scores >= threshold) & same_numbers, k=1))
+    return [(block[i], block[j], float(scores[i, j])) for i, j in zip(first, second)]
+
+
+def _connected_groups(pairs, count):
+    """Union-find over pair indices; returns the groups of two or more."""
+    parent = list(range(count))
+
+    def root(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for first, second, _ in pairs:
+        parent[root(first)] = root(second)
+
+    groups = defaultdict(list)
+    for first, second, _ in pairs:
+        groups[root(first)].extend((first, second))
+    return [sorted(set(members)) for members in groups.values()]
+
+
+def find_duplicates(threshold=SIMILARITY_THRESHOLD, prefix=4, max_block=500):
+    """
+    Return (groups, stats). Each group is a dict with the winning wine, the losers
+    and their best score against another member; the winner is the wine with the
+    most lots, then the one holding canonical_key, then the oldest.
+    """
+    wines = list(Wine.objects.order_by('id').values_list('id', 'name', 'vintage', 'canonical_key'))
+    names = [canonical_name(name) for _, name, _, _ in wines]
+    buckets = [
+        np.fromiter({zlib.crc32(gram.encode()) % TRIGRAM_BUCKETS for gram in trigrams(name)}, dtype=np.intp)
+        for name in names
+    ]
+    numbers = np.array([_numbers(name) for name in names], dtype=np.int64)
+
+    by_vintage = defaultdict(list)
+    for index, (_, _, vintage, _) in enumerate(wines):
+        by_vintage[canonical_vintage(vintage)].append(index)
+
+    pairs = []
+    blocks = 0
+    for members in by_vintage.values():
+        for block in _blocks(members, names, prefix, max_block):
+            blocks += 1
+            pairs.extend(_similar_pairs(block, buckets, numbers, threshold))
+
+    best = defaultdict(float)
+    for first, second, score in pairs:
+        best[first] = max(best[first], score)
+        best[second] = max(best[second], score)
+
+    members = _connected_groups(pairs, len(wines))
+    wine_ids = [wines[index][0] for group in members for index in group]
+    lot_counts = dict(
+        WineInventory.objects.filter(wine_id__in=wine_ids)
+        .values('wine').annotate(lots=Count('id')).values_list('wine', 'lots')
+    )
+
+    groups = []
+    for group in members:
+        ranked = sorted(group, key=lambda index: (
+            -lot_counts.get(wines[index][0], 0), wines[index][3] is None, wines[index][0]))
+        winner, losers = ranked[0], ranked[1:]
+        groups.append({
+            'winner': wines[winner][:3],
+            'losers': [(*wines[index][:3], best[index]) for index in losers],
+        })
+
+    stats = {'wines': len(wines), 'blocks': blocks, 'pairs': len(pairs)}
+    return groups, stats
+
+
+def _weighted_price(lots):
+    """Qty-weighted purchase price of lot rows; unpriced lots are ignored."""
+    priced = [(lot[6], lot[5]) for lot in lots if lot[6] is not None]
+    if not priced:
+        return None
+    total = sum(qty for _, qty in priced)
+    if total:
+        price = sum(price * qty for price, qty in priced) / total
+    else:
+        price = sum(price for price, _ in priced) / len(priced)
+    return price.quantize(Decimal('0.01'))
+
+
+def merge_duplicates(groups):
+    """
+    Repoint the losers' lots to their winner and delete the losers, in one transaction.
+
+    Lots that would then share a lot key (inv_lot_key_uniq) are combined: the
+    quantities are summed on one lot (the winner's when it has one), at their
+    qty-weighted purchase price, and the others are deleted. A group where such a lot is on a wine list cannot be combined
+    without rewriting the list, so it is skipped and returned for manual review.
+    """
+    target = {loser[0]: group['winner'][0] for group in groups for loser in group['losers']}
+    winners = {group['winner'][0] for group in groups}
+
+    with transaction.atomic():
+        lots = list(
+            WineInventory.objects.select_for_update()
+            .filter(wine_id__in=[*target, *winners])
+            .order_by('id')
+            .values_list('id', 'wine_id', 'bottle_size', 'purchase_date', 'source', 'qty', 'purchase_price')
+        )
+        listed = set(
+            WineItem.objects.filter(inventory_id__in=[lot[0] for lot in lots])
+            .values_list('inventory_id', flat=True)
+        )
+
+        by_key = defaultdict(list)
+        for lot in lots:
+            wine_id = lot[1]
+            by_key[(target.get(wine_id, wine_id), *lot[2:5])].append(lot)
+
+        combined = {}  # surviving lot id -> (summed qty, weighted price)
+        absorbed = []
+        skipped = set()
+        for (winner, *_), same in by_key.items():
+            if len(same) < 2:
+                continue
+            survivor = next((lot for lot in same if lot[1] == winner), same[0])
+            others = [lot for lot in same if lot is not survivor]
+            if any(lot[0] in listed for lot in others):
+                skipped.add(winner)
+                continue
+            combined[survivor[0]] = (sum(lot[5] for lot in same), _weighted_price(same))
+            absorbed.extend(lot[0] for lot in others)
+
+        if skipped:
+            # Undo the plan for skipped groups: their lots stay where they are
+            skipped_wines = skipped | {loser for loser, winner in target.items() if winner in skipped}
+            keep = {lot[0] for lot in lots if lot[1] in skipped_wines}
+            combined = {pk: merged for pk, merged in combined.items() if pk not in keep}
+            absorbed = [pk for pk in absorbed if pk not in keep]
+            target = {loser: winner for loser, winner in target.items() if winner not in skipped}
+
+        now = timezone.now()
+        WineInventory.objects.filter(pk__in=absorbed).delete()
+        WineInventory.objects.bulk_update(
+            [WineInventory(pk=pk, qty=qty, purchase_price=price, updated_at=now)
+             for pk, (qty, price) in combined.items()],
+            ['qty', 'purchase_price', 'updated_at'], batch_size=1000,
+        )
+
+        losers = list(target)
+        repointed = 0
+        for start in range(0, len(losers), 1000):
+            chunk = losers[start:start + 1000]
+            repointed += WineInventory.objects.filter(wine_id__in=chunk).update(
+                wine_id=Case(
+                    *[When(wine_id=loser, then=Value(target[loser])) for loser in chunk],
+                    output_field=BigIntegerField(),
+                ),
+                updated_at=now,
+            )
+
+        Wine.objects.filter(pk__in=losers).delete()
+        # A winner without a key takes over the one its losers held
+        Wine.objects.filter(pk__in=set(target.values()), canonical_key=None).refresh_canonical_keys()
+
+    return {
+        'merged': len(losers),
+        'repointed': repointed,
+        'combined': len(absorbed),
+        'skipped': [group for group in groups if group['winner'][0] in skipped],
+    }
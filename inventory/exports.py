@@ -0,0 +1,108 @@
+"""
+Spreadsheet exports of WineInventory lots and ZIP bundles of files, shared by the
+export views and the job queue.
+"""
+import io
+import zipfile
+
+from openpyxl import Workbook
+
+from .models import WineInventory
+
+EXPORT_COLUMNS = [
+    'Name', 'Category', 'Vintage', 'Region', 'Bottle Size (cl)', 'Price (€)', 'Quantity',
+    'Status', 'Total (€)', 'Source', 'Purchase Date', 'Location', 'Rating', 'Note',
+]
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _export_row(inv):
+    wine = inv.wine
+    price = float(inv.purchase_price) if inv.purchase_price else 0.0
+    return [
+        wine.name,
+        wine.get_category_display(),
+        wine.vintage or '—',
+        wine.region or '—',
+        inv.bottle_size or '—',
+        price,
+        inv.qty,
+        str(inv.get_status_display()),
+        price * inv.qty,
+        inv.source or '—',
+        inv.purchase_date.strftime('%Y-%m-%d') if inv.purchase_date else '—',
+        inv.location or '—',
+        wine.rating or '—',
+        wine.note or '',
+    ]
+
+
+def write_inventory_xlsx(inventory_ids, fileobj, progress=None):
+    """
+    Write the selected lots as an xlsx workbook to `fileobj`; returns the row count.
+
+    Write-only mode spools rows to disk as they are appended, so memory stays
+    flat however many lots are exported. `progress`, if given, is called with
+    the fraction of rows written after every chunk.
+    """
+    inventories = (
+        WineInventory.objects.filter(id__in=inventory_ids)
+        .select_related('wine')
+        .order_by('wine__name', 'id')
+    )
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Selected Wines')
+    sheet.append(EXPORT_COLUMNS)
+    count = 0
+    total = len(set(inventory_ids)) or 1
+    for inv in inventories.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        sheet.append(_export_row(inv))
+        count += 1
+        if progress is not None and count % EXPORT_CHUNK_SIZE == 0:
+            progress(count / total)
+
+    workbook.save(fileobj)
+    return count
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable sink collecting zipfile's output until drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, chunk_size=64 * 1024):
+    """
+    Yield a ZIP archive of (arcname, path) entries as it is built.
+
+    zipfile writes data descriptors when its target cannot seek, so each file is
+    copied through in chunk_size pieces and the archive is never held whole.
+    Entries are stored, not deflated: PDFs and xlsx files are already compressed.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            with open(path, "rb") as src, archive.open(arcname, "w", force_zip64=True) as dest:
+                while chunk := src.read(chunk_size):
+                    dest.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            if data := sink.drain():
+                yield data
+    if data := sink.drain():
+        yield data
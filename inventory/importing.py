@@ -0,0 +1,472 @@
+"""
+Shared parsing and writing for the inventory workbook importers.
+
+A sheet is normalized column-wise with pandas into one row per lot (see
+normalize_sheet), then written either row by row or in bulk (see
+bulk_write_lots). read_workbook reads the file once and parse_sheets parses
+its sheets in a process pool; parsing never touches the database, so writes
+stay in the calling process. stream_sheet reads huge sheets in bounded memory.
+
+Re-imports are idempotent: lots are upserted on their natural key
+(LOT_KEY_FIELDS), and a sheet whose normalized contents match the stored
+sheet_fingerprint is skipped.
+"""
+import hashlib
+import io
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from django.db import connection
+from django.utils import timezone
+
+from .naming import canonical_key, clean_name
+
+# Map Excel couleur values to Wine model CATEGORY_CHOICES
+CATEGORY_MAPPING = {
+    'BLANC': 'white',
+    'WHITE': 'white',
+    'ROUGE': 'red',
+    'RED': 'red',
+    'ROSE': 'rose',
+    'ROSÉ': 'rose',
+    'CHAMPAGNE': 'champagne',
+    'ROSE CHAMPAGNE': 'rose_champagne',
+    'SPARKLING': 'sparkling',
+    'YELLOW': 'yellow',
+    'LIQUEUR': 'liqueur',
+    'DESSERT': 'dessert',
+    'FORTIFIED': 'fortified',
+    'ORANGE': 'orange'
+}
+
+# Columns of the flat CSV/JSONL inventory dumps (see import_inventory_csv)
+RECORD_COLUMNS = ['name', 'category', 'vintage', 'region', 'bottle_size', 'qty', 'purchase_price',
+                  'purchase_date', 'source']
+
+
+def category_codes():
+    """CATEGORY_MAPPING plus the category codes themselves, keyed by upper-case value."""
+    from .models import CATEGORY_CHOICES
+
+    codes = {code.upper(): code for code, _ in CATEGORY_CHOICES}
+    codes.update(CATEGORY_MAPPING)
+    return codes
+
+
+# Section rows carrying no wine
+SKIPPED_HEADERS = {"WHITE WINE 白葡萄酒", "RED WINE 紅葡萄酒"}
+# Section rows setting the region of the wines below them
+REGION_HEADERS = {"CHAMPAGNE 香檳", "BURGUNDY 勃艮第", "LOIRE 魯瓦河", "VALLEY OF RHONE 隆河谷", "SAVOIE 薩瓦河"}
+
+LOT_COLUMNS = ['name', 'category', 'vintage', 'region', 'bottle_size', 'qty', 'purchase_price']
+
+# Natural key of a WineInventory lot, unique in the database (inv_lot_key_uniq)
+LOT_KEY_FIELDS = ['wine', 'bottle_size', 'purchase_date', 'source']
+# What a re-import refreshes on an existing lot; status and location stay as edited
+LOT_UPDATE_FIELDS = ['qty', 'purchase_price', 'updated_at']
+
+COPY_CHUNK_SIZE = 1 << 16
+
+
+def parse_sheet_date(sheet_name):
+    """Sheets are named after their inventory date; None if the name is not a date."""
+    try:
+        return datetime.strptime(sheet_name.strip(), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _text(df, column):
+    if column not in df:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[column].fillna("").astype(str).str.strip()
+
+
+def _number(text):
+    """Numeric series of a text column; unparsable and non-finite cells ('inf', '1e999') are NaN."""
+    return pd.to_numeric(text, errors='coerce').replace([np.inf, -np.inf], np.nan)
+
+
+def _nullable(series):
+    """Object series with missing values as None, as the ORM expects."""
+    return series.astype(object).where(series.notna(), None)
+
+
+def clean_names(names):
+    """Title-case wine names, keeping the usual abbreviations upper-case."""
+    return names.map(clean_name)
+
+
+def canonical_keys(lots):
+    return [canonical_key(name, vintage) for name, vintage in zip(lots['name'], lots['vintage'])]
+
+
+def _region_names(upper):
+    """"BURGUNDY 勃艮第" -> "Burgundy"."""
+    return upper.str.replace(r"[^A-Z ]", "", regex=True).str.strip().str.title()
+
+
+def last_region(df, region=None):
+    """Region in effect after the last row of `df`, given `region` in effect before its first."""
+    upper = _text(df, 'ARTICLE').str.upper()
+    headers = upper[upper.isin(REGION_HEADERS)]
+    return _region_names(headers).iloc[-1] if len(headers) else region
+
+
+def normalize_sheet(df, region=None):
+    """
+    Turn a raw inventory sheet into one row per lot with LOT_COLUMNS.
+
+    Column-wise equivalent of the historical per-row parsing: header rows are
+    dropped, region headers are forward-filled onto the wines below them, rows
+    without a numeric quantity are skipped, an unparsable price becomes 0 and
+    an unparsable vintage becomes "-". Rows repeating a lot (same wine and
+    bottle size) are merged: quantities summed, prices averaged by quantity.
+
+    `region` applies to wines above the first region header, for a `df` that
+    continues an earlier chunk of the sheet (see stream_sheet).
+    """
+    article = _text(df, 'ARTICLE')
+    upper = article.str.upper()
+
+    is_region = upper.isin(REGION_HEADERS)
+    # Each region header starts a group; its wines take the header's name
+    group = is_region.cumsum()
+    region = (
+        _region_names(upper)
+        .where(is_region)
+        .groupby(group)
+        .transform('first')
+        .where(group > 0, region)
+    )
+
+    qty = _number(_text(df, 'UNITÉS'))
+    keep = (article != "") & ~upper.isin(SKIPPED_HEADERS) & ~is_region & qty.notna()
+
+    size = _number(_text(df, 'CL')[keep])
+    price = _number(
+        _text(df, 'PRICE EN EUROS')[keep].str.replace("€", "", regex=False)
+        .str.replace(",", "", regex=False).str.strip()
+    ).fillna(0)
+
+    vintage_raw = _text(df, 'MILLESIME')[keep]
+    vintage_num = _number(vintage_raw)
+    vintage = vintage_num.dropna().astype('int64').astype(str).reindex(vintage_raw.index).fillna("-")
+    vintage = vintage.mask(vintage_raw.str.upper() == "NV", "NV")
+
+    lots = pd.DataFrame({
+        'name': clean_names(article[keep]),
+        'category': _text(df, 'COULEUR')[keep].str.upper().map(CATEGORY_MAPPING).fillna('other'),
+        'vintage': vintage,
+        'region': _nullable(region[keep]),
+        'bottle_size': _nullable(np.trunc(size).astype('Int64')),
+        'qty': qty[keep].astype('int64'),
+        'purchase_price': price.astype(float),
+    }, columns=LOT_COLUMNS)
+    return merge_repeated_lots(lots)
+
+
+def merge_repeated_lots(lots):
+    """One row per (canonical key, bottle size); the first spelling of a wine names it."""
+    merged = (
+        lots.assign(key=canonical_keys(lots), value=lots['qty'] * lots['purchase_price'])
+        .groupby(['key', 'bottle_size'], dropna=False, sort=False)
+        .agg(name=('name', 'first'), category=('category', 'first'), vintage=('vintage', 'first'),
+             region=('region', 'first'), qty=('qty', 'sum'), value=('value', 'sum'),
+             purchase_price=('purchase_price', 'mean'))
+        .reset_index()
+    )
+    merged['purchase_price'] = (
+        (merged['value'] / merged['qty']).where(merged['qty'] > 0, merged['purchase_price']).round(2)
+    )
+    merged['region'] = _nullable(merged['region'])
+    merged['bottle_size'] = _nullable(pd.to_numeric(merged['bottle_size']).astype('Int64'))
+    return merged[LOT_COLUMNS]
+
+
+def normalize_records(df, default_source):
+    """
+    Normalize a chunk of RECORD_COLUMNS rows from a CSV/JSONL dump into lots with
+    purchase_date and source; the pandas twin of the SQL in import_inventory_csv.
+    """
+    name = _text(df, 'name')
+    qty = _number(_text(df, 'qty'))
+    keep = (name != "") & (qty >= 0)
+
+    vintage_raw = _text(df, 'vintage')[keep]
+    vintage_num = _number(vintage_raw)
+    vintage = vintage_num[vintage_num >= 0].astype('int64').astype(str).reindex(vintage_raw.index).fillna("-")
+    vintage = vintage.mask(vintage_raw.str.upper() == "NV", "NV")
+
+    size = _number(_text(df, 'bottle_size')[keep])
+    price = _number(_text(df, 'purchase_price')[keep].str.replace(r"[€,\s]", "", regex=True)).fillna(0)
+    source = _text(df, 'source')[keep]
+
+    lots = pd.DataFrame({
+        'name': name[keep],
+        'category': _text(df, 'category')[keep].str.upper().map(category_codes()).fillna('other'),
+        'vintage': vintage,
+        'region': _nullable(_text(df, 'region')[keep].replace("", None)),
+        'bottle_size': _nullable(np.trunc(size.where(size >= 0)).astype('Int64')),
+        'qty': qty[keep].astype('int64'),
+        'purchase_price': price.astype(float),
+        'purchase_date': pd.to_datetime(_text(df, 'purchase_date')[keep], format='%Y-%m-%d', errors='coerce').dt.date,
+        'source': source.mask(source == "", default_source),
+    })
+    lots['purchase_date'] = _nullable(lots['purchase_date'])
+    return lots
+
+
+def accumulate_lots(lots, totals):
+    """
+    Fold a batch of merged lots into `totals`, the running quantity and value
+    per (canonical key, bottle size) of everything written so far in this run,
+    and return the batch with those running quantities and qty-weighted prices.
+
+    Upserting the result adds a lot repeated across batches to what an earlier
+    batch wrote instead of overwriting it, the same as merge_repeated_lots does
+    within a batch. len(totals) is the number of distinct lots written.
+    """
+    qtys, prices = [], []
+    for key, bottle_size, qty, price in zip(
+            canonical_keys(lots), lots['bottle_size'], lots['qty'], lots['purchase_price']):
+        lot_key = (key, None if pd.isna(bottle_size) else int(bottle_size))
+        total_qty, total_value, price_sum, batches = totals.get(lot_key, (0, 0.0, 0.0, 0))
+        total_qty += int(qty)
+        total_value += int(qty) * float(price)
+        price_sum += float(price)
+        batches += 1
+        totals[lot_key] = (total_qty, total_value, price_sum, batches)
+        qtys.append(total_qty)
+        # Lots with no bottles are priced by plain average, as in merge_repeated_lots
+        prices.append(round(total_value / total_qty if total_qty > 0 else price_sum / batches, 2))
+    return lots.assign(qty=qtys, purchase_price=prices)
+
+
+def sheet_fingerprint(lots):
+    """Content hash of a normalized sheet, stored in ImportSheet to skip unchanged sheets."""
+    hashes = pd.util.hash_pandas_object(lots[LOT_COLUMNS], index=False)
+    return hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def _keyed(lots):
+    return lots.assign(
+        key=canonical_keys(lots),
+        bottle_size=pd.to_numeric(lots['bottle_size']).astype('Int64'),
+    )
+
+
+def diff_snapshots(old, new):
+    """
+    Compare two normalized sheets on the canonical lot key (wine key + bottle size)
+    with one outer merge. Returns DataFrames of added, removed and changed lots;
+    a lot is changed when its quantity or price differs.
+    """
+    merged = _keyed(old).merge(
+        _keyed(new), on=['key', 'bottle_size'], how='outer', suffixes=('_old', '_new'), indicator=True,
+        sort=False,
+    )
+    side = merged['_merge']
+
+    def lots_from(suffix, rows):
+        columns = {f"{column}{suffix}": column for column in LOT_COLUMNS if column != 'bottle_size'}
+        return merged.loc[rows, ['bottle_size', *columns]].rename(columns=columns)[LOT_COLUMNS]
+
+    both = merged[side == 'both']
+    qty_change = both['qty_new'] - both['qty_old']
+    price_changed = ~np.isclose(both['purchase_price_new'].to_numpy(dtype=float),
+                                both['purchase_price_old'].to_numpy(dtype=float), equal_nan=True)
+    changed = both[(qty_change != 0).to_numpy() | price_changed]
+    changed = pd.DataFrame({
+        'name': changed['name_new'],
+        'category': changed['category_new'],
+        'vintage': changed['vintage_new'],
+        'region': changed['region_new'],
+        'bottle_size': changed['bottle_size'],
+        'qty_old': changed['qty_old'].astype('int64'),
+        'qty_new': changed['qty_new'].astype('int64'),
+        'qty_change': qty_change[changed.index].astype('int64'),
+        'purchase_price_old': changed['purchase_price_old'],
+        'purchase_price_new': changed['purchase_price_new'],
+    })
+
+    diff = {
+        'added': lots_from('_new', side == 'right_only').astype({'qty': 'int64'}),
+        'removed': lots_from('_old', side == 'left_only').astype({'qty': 'int64'}),
+        'changed': changed,
+    }
+    return {kind: lots.sort_values(['name', 'vintage', 'bottle_size']).reset_index(drop=True)
+            for kind, lots in diff.items()}
+
+
+_WORKBOOK = None
+
+
+def _open_workbook(data):
+    """Pool initializer: each worker opens the workbook bytes once."""
+    global _WORKBOOK
+    _WORKBOOK = pd.ExcelFile(io.BytesIO(data))
+
+
+def _read_sheet(workbook, sheet_name):
+    df = workbook.parse(sheet_name)
+    return sheet_name, len(df), normalize_sheet(df)
+
+
+def _parse_sheet(sheet_name):
+    return _read_sheet(_WORKBOOK, sheet_name)
+
+
+def read_workbook(file_path):
+    """Read the workbook file once; returns (its bytes, its sheet names)."""
+    with open(file_path, 'rb') as workbook_file:
+        data = workbook_file.read()
+    return data, pd.ExcelFile(io.BytesIO(data)).sheet_names
+
+
+def parse_sheets(data, sheet_names, processes=None):
+    """
+    Yield (sheet name, raw row count, normalized lots) for every sheet, in order.
+
+    Sheets are parsed and normalized in up to `processes` worker processes
+    (default: one per CPU, at most one per sheet), each opening `data` once.
+    """
+    processes = min(processes or os.cpu_count() or 1, len(sheet_names))
+    if processes <= 1:
+        workbook = pd.ExcelFile(io.BytesIO(data))
+        for sheet_name in sheet_names:
+            yield _read_sheet(workbook, sheet_name)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),  # no inherited DB connections or locks
+        initializer=_open_workbook,
+        initargs=(data,),
+    ) as pool:
+        yield from pool.map(_parse_sheet, sheet_names)
+
+
+def stream_sheet(worksheet, batch_size):
+    """
+    Yield (raw row count, normalized lots) for every `batch_size` rows of a
+    read-only openpyxl worksheet, so memory stays bounded by the batch size.
+
+    The region in effect is carried from one batch to the next. Repeats of a
+    lot are merged within a batch only; pass the batches through
+    accumulate_lots to merge them across the sheet.
+    """
+    header = next(worksheet.iter_rows(max_row=1, values_only=True), None)
+    if header is None:
+        return
+    columns = ["" if cell is None else str(cell).strip() for cell in header]
+    # max_col pads short rows with None, so every row matches the header
+    rows = worksheet.iter_rows(min_row=2, max_col=len(columns), values_only=True)
+
+    region = None
+    while batch := list(itertools.islice(rows, batch_size)):
+        df = pd.DataFrame.from_records(batch, columns=columns)
+        yield len(df), normalize_sheet(df, region)
+        region = last_region(df, region)
+
+
+def resolve_wines(lots, batch_size):
+    """
+    Map the canonical key of every wine in `lots` to a Wine id, prefetching
+    existing wines by key with one query and bulk-creating the missing ones.
+    Returns (key -> id, number of wines created).
+    """
+    from .models import Wine
+
+    wines = {}
+    for key, name, category, vintage, region in zip(
+            canonical_keys(lots), lots['name'], lots['category'], lots['vintage'], lots['region']):
+        wines.setdefault(key, (name, category, vintage, region))
+
+    wine_ids = dict(Wine.objects.filter(canonical_key__in=wines).values_list('canonical_key', 'id'))
+    created = Wine.objects.bulk_create(
+        [Wine(name=name, category=category, vintage=vintage, region=region, canonical_key=key)
+         for key, (name, category, vintage, region) in wines.items() if key not in wine_ids],
+        batch_size=batch_size,
+    )
+    wine_ids.update((wine.canonical_key, wine.pk) for wine in created)
+    return wine_ids, len(created)
+
+
+def bulk_write_lots(lots, purchase_date, source, batch_size=1000):
+    """
+    Upsert every lot of a normalized sheet on LOT_KEY_FIELDS; returns (lots, wines created).
+    Callers wrap this in a transaction so a failing sheet leaves nothing behind.
+    """
+    from .models import WineInventory
+
+    wine_ids, wines_created = resolve_wines(lots, batch_size)
+    inventories = [
+        WineInventory(
+            wine_id=wine_ids[key],
+            bottle_size=bottle_size,
+            purchase_price=purchase_price,
+            qty=qty,
+            purchase_date=purchase_date,
+            source=source,
+            status="in_stock",
+        )
+        for key, bottle_size, qty, purchase_price in zip(
+            canonical_keys(lots), lots['bottle_size'], lots['qty'], lots['purchase_price'])
+    ]
+    if connection.features.supports_nulls_distinct_unique_constraints:
+        # INSERT ... ON CONFLICT (inv_lot_key_uniq) DO UPDATE
+        WineInventory.objects.bulk_create(
+            inventories,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=LOT_KEY_FIELDS,
+            update_fields=LOT_UPDATE_FIELDS,
+        )
+    else:
+        _upsert_in_memory(inventories, purchase_date, source, batch_size)
+    return len(inventories), wines_created
+
+
+def copy_from_stdin(cursor, sql, dump):
+    """
+    Run a PostgreSQL `COPY ... FROM STDIN` reading the file-like `dump`, with psycopg2 or psycopg 3.
+    Driver errors are raised as Django's (IntegrityError, DataError...), as cursor.execute does.
+    """
+    raw = cursor.cursor
+    with cursor.db.wrap_database_errors:
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, dump, size=COPY_CHUNK_SIZE)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                while chunk := dump.read(COPY_CHUNK_SIZE):
+                    copy.write(chunk)
+
+
+def _upsert_in_memory(inventories, purchase_date, source, batch_size):
+    """Backends without the NULLS NOT DISTINCT key index: match existing lots with one query."""
+    from .models import WineInventory
+
+    existing = {
+        (wine_id, bottle_size): pk
+        for pk, wine_id, bottle_size in WineInventory.objects.filter(
+            purchase_date=purchase_date, source=source,
+            wine_id__in={inventory.wine_id for inventory in inventories},
+        ).values_list('id', 'wine_id', 'bottle_size')
+    }
+    now = timezone.now()
+    updates, inserts = [], []
+    for inventory in inventories:
+        inventory.pk = existing.get((inventory.wine_id, inventory.bottle_size))
+        if inventory.pk is None:
+            inserts.append(inventory)
+        else:
+            inventory.updated_at = now
+            updates.append(inventory)
+    WineInventory.objects.bulk_update(updates, LOT_UPDATE_FIELDS, batch_size=batch_size)
+    WineInventory.objects.bulk_create(inserts, batch_size=batch_size)
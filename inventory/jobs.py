@@ -0,0 +1,188 @@
+"""
+Database-backed background jobs.
+
+Views enqueue a Job row and return immediately; the run_workers management
+command claims queued jobs with SELECT ... FOR UPDATE SKIP LOCKED and runs the
+handler registered for the job's kind. Handlers return a JSON-serializable
+result; a result carrying a "path" is offered for download by job_download.
+
+A running job's heartbeat_at is touched while its worker is alive, so only
+jobs of dead workers are requeued; finished jobs and their files are purged
+after settings.JOB_FILES_MAX_AGE.
+"""
+import io
+import threading
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Job, WineList
+
+JOB_HANDLERS = {}
+
+# Seconds between heartbeats of a running job; keep run_workers --stale-after well above it
+HEARTBEAT_SECONDS = 30
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler for jobs of `kind`."""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def job_files_dir():
+    path = Path(settings.JOB_FILES_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def remove_job_file(path):
+    """Delete `path` if it is a file of JOB_FILES_DIR; files elsewhere belong to someone else."""
+    if path and Path(path).resolve().parent == Path(settings.JOB_FILES_DIR).resolve():
+        Path(path).unlink(missing_ok=True)
+
+
+def enqueue(kind, **params):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, params=params)
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running, skipping rows other workers hold."""
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def set_progress(job, percent):
+    """Record how far a running job is (0-100) for pollers of job_status; also a heartbeat."""
+    Job.objects.filter(pk=job.pk).update(
+        progress=max(0, min(100, int(percent))), heartbeat_at=timezone.now())
+
+
+@contextmanager
+def heartbeat(job):
+    """Touch the job's heartbeat_at every HEARTBEAT_SECONDS from a side thread while the block runs."""
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(HEARTBEAT_SECONDS):
+                Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()  # this thread's own connection
+
+    thread = threading.Thread(target=beat, name=f"job-heartbeat-{job.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording its result or traceback."""
+    try:
+        with heartbeat(job):
+            result = JOB_HANDLERS[job.kind](job, **job.params)
+    except Exception:
+        job.status = 'failed'
+        job.error = traceback.format_exc()
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'progress', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(older_than):
+    """
+    Put back jobs whose worker died mid-run: running, with no heartbeat for
+    longer than `older_than`. Long jobs of live workers keep beating and stay put.
+    """
+    return Job.objects.filter(
+        status='running', heartbeat_at__lt=timezone.now() - older_than,
+    ).update(status='queued', started_at=None, heartbeat_at=None, progress=0)
+
+
+def purge_finished_jobs(older_than):
+    """Delete jobs finished more than `older_than` ago, with their uploads and results in JOB_FILES_DIR."""
+    expired = Job.objects.filter(status__in=['succeeded', 'failed'], finished_at__lt=timezone.now() - older_than)
+    for params, result in expired.values_list('params', 'result').iterator():
+        remove_job_file((params or {}).get('file_path'))
+        remove_job_file((result or {}).get('path'))
+    return expired.delete()[0]
+
+
+# -----------------------------------
+# Handlers
+# -----------------------------------
+
+@job_handler('import_inventory')
+def import_inventory_job(job, file_path, **options):
+    from .management.commands.import_inventory import Command as ImportInventoryCommand
+
+    out = io.StringIO()
+    command = ImportInventoryCommand(stdout=out, stderr=out)
+    # Advanced once per sheet
+    command.progress = lambda fraction: set_progress(job, fraction * 100)
+    try:
+        # Raises CommandError on an unreadable file, so the job ends failed
+        call_command(command, file_path, **options)
+    finally:
+        # The upload is only needed for this run
+        remove_job_file(file_path)
+    return {'output': out.getvalue()}
+
+
+@job_handler('wine_list_pdf')
+def wine_list_pdf_job(job, uuid, engine=None, language=None):
+    from . import pdf
+
+    wine_list = WineList.objects.exclude(status='archived').get(uuid=uuid)
+    rows = pdf.wine_list_rows(wine_list)
+    # Rows loaded: what is left is the render (or a cache hit)
+    set_progress(job, 20)
+    path = pdf.get_or_render(wine_list, rows, engine=engine, language=language)
+    return {
+        'path': str(path),
+        'filename': pdf.pdf_filename(pdf.wine_list_title(wine_list)),
+        'content_type': 'application/pdf',
+    }
+
+
+@job_handler('export_inventory')
+def export_inventory_job(job, inventory_ids):
+    from .exports import write_inventory_xlsx
+
+    path = job_files_dir() / f"{job.uuid}.xlsx"
+    with open(path, 'wb') as xlsx_file:
+        rows = write_inventory_xlsx(
+            inventory_ids, xlsx_file, progress=lambda fraction: set_progress(job, fraction * 100))
+    return {
+        'path': str(path),
+        'filename': 'selected_wines.xlsx',
+        'content_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'rows': rows,
+    }
@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.models import CATEGORY_CHOICES
+from inventory.pdf import PDF_ENGINES
+
+
+def _synthetic_rows(size, rng):
+    regions = ["Burgundy", "Champagne", "Loire", "Valley Of Rhone", "Savoie"]
+    return [
+        (f"Domaine {rng.randint(1, 500)} Cuvée {rng.randint(1, 50)} Vieilles Vignes",
+         str(rng.randint(1985, 2022)), rng.choice(CATEGORY_CHOICES)[0], rng.choice(regions),
+         rng.choice([37, 75, 150]), rng.randint(1, 24), "Tasting note " * rng.randint(0, 4),
+         None, None)
+        for _ in range(size)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Time every wine list PDF engine on synthetic lists of increasing size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Number of list lines to render')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per engine and size (best is kept)')
+        parser.add_argument('--engines', nargs='+', default=list(PDF_ENGINES), choices=list(PDF_ENGINES))
+        parser.add_argument('--language', default=None, help="e.g. 'zh' to exercise CJK fonts")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        self.stdout.write(f"{'engine':<12} {'lines':>7} {'best (s)':>10} {'lines/s':>10} {'size (KB)':>10}")
+
+        for size in options['sizes']:
+            rows = _synthetic_rows(size, rng)
+            for engine in options['engines']:
+                render = PDF_ENGINES[engine]
+                try:
+                    timings = []
+                    for _ in range(options['repeat']):
+                        start = time.perf_counter()
+                        data = render(f"Benchmark {size}", rows, options['language'])
+                        timings.append(time.perf_counter() - start)
+                except (ImportError, OSError) as e:
+                    self.stderr.write(self.style.WARNING(f"⚠️ {engine} unavailable: {e}"))
+                    continue
+
+                best = min(timings)
+                self.stdout.write(
+                    f"{engine:<12} {size:>7} {best:>10.3f} {size / best:>10.0f} {len(data) / 1024:>10.1f}")
@@ -0,0 +1,334 @@
+import json
+import math
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings, setup_test_environment,
+                               teardown_test_environment)
+from django.urls import URLPattern, reverse
+
+from client_portal import urls as client_portal_urls
+from inventory import pdf
+from inventory import urls as inventory_urls
+from inventory.models import Job, WineInventory, WineList
+from inventory.synthetic import seed_synthetic
+
+URLCONFS = {'inventory': inventory_urls, 'client_portal': client_portal_urls}
+
+# Most SQL queries one request may run, at any dataset size. Every scenario
+# needs one: a constant budget is what catches an N+1 creeping back in.
+QUERY_BUDGETS = {
+    'inventory:root': 0,
+    'inventory:login': 0,
+    'inventory:logout': 4,
+    'inventory:set_language': 4,
+    'inventory:inventory_list': 2,
+    'inventory:inventory_api': 3,
+    'inventory:wine_search': 4,
+    'inventory:export_wines': 1,
+    'inventory:batch_edit_wines': 3,
+    'inventory:wine_list_index': 3,
+    'inventory:create_wine_list': 7,
+    'inventory:update_wine_list_status': 3,
+    'inventory:export_wine_lists_zip': 4,
+    'inventory:admin_amend_wine_list': 9,
+    'inventory:wine_list': 2,
+    'inventory:export_wine_list_pdf': 4,
+    'inventory:enqueue_job': 3,
+    'inventory:job_status': 3,
+    'inventory:job_download': 3,
+    'client_portal:input_wine_list_id': 0,
+    'client_portal:client_wine_list': 2,
+    'client_portal:client_wine_list_json': 2,
+    'client_portal:client_submit_wine_list': 7,
+}
+
+# Slowest median response (ms) at any dataset size
+DEFAULT_TIME_BUDGET_MS = 1000
+TIME_BUDGETS_MS = {
+    'inventory:export_wine_list_pdf': 10000,
+    'inventory:export_wine_lists_zip': 10000,
+}
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'views.json'
+
+# Status each scenario must answer with (default 200); anything else fails the run
+EXPECTED_STATUS = {
+    'inventory:root': 302,
+    'inventory:logout': 302,
+    'inventory:set_language': 302,
+    'inventory:batch_edit_wines': 302,
+    'inventory:enqueue_job': 202,
+}
+
+# PDF views render with ReportLab: pure Python, so they are measured on any machine.
+# Only these scenarios may be skipped, and only when the engine cannot load.
+PDF_ENGINE = 'reportlab'
+PDF_SCENARIOS = {'inventory:export_wine_list_pdf', 'inventory:export_wine_lists_zip'}
+
+
+def _dataset(size):
+    """seed_synthetic arguments for `size` wines: lists and their items grow with it."""
+    return {
+        'wines': size,
+        'lots': size * 3,
+        'lists': max(size // 50, 5),
+        'items_per_list': max(size // 20, 5),
+        'seed': 0,
+    }
+
+
+def _fixtures():
+    """Objects the scenarios point at, in a freshly seeded database."""
+    lots = list(WineInventory.objects.order_by('id').values_list('id', flat=True)[:200])
+    # The biggest list still open for review: amend and submit need status "created"
+    wine_list = (
+        WineList.objects.filter(status='created').annotate(n=Count('items')).order_by('-n', 'id').first()
+    )
+    items = list(wine_list.items.values('id', 'offer_qty', 'offer_price'))
+
+    download = Path(tempfile.gettempdir()) / 'vaguevin-benchmark.txt'
+    download.write_bytes(b'x' * 1024)
+    job = Job.objects.create(
+        kind='export_inventory', status='succeeded',
+        result={'path': str(download), 'filename': download.name, 'content_type': 'text/plain'},
+    )
+    return {'lots': lots, 'wine_list': wine_list, 'items': items, 'job': job}
+
+
+def _json(payload):
+    return {'data': json.dumps(payload, default=str), 'content_type': 'application/json'}
+
+
+# URL pattern -> (method, login required, path and request kwargs from the fixtures)
+SCENARIOS = {
+    'inventory:root': ('get', False, lambda f: ('/admin/', {})),
+    'inventory:login': ('get', False, lambda f: (reverse('login'), {})),
+    'inventory:logout': ('get', True, lambda f: (reverse('logout'), {})),
+    'inventory:set_language': ('get', True, lambda f: (reverse('set_language'), {'data': {'lang': 'fr'}})),
+    'inventory:inventory_list': ('get', True, lambda f: (reverse('inventory_list'), {})),
+    'inventory:inventory_api': ('get', True, lambda f: (reverse('inventory_api'), {'data': {'limit': 100}})),
+    'inventory:wine_search': ('get', True, lambda f: (reverse('wine_search'), {'data': {'q': 'chambertin'}})),
+    'inventory:export_wines': (
+        'post', True, lambda f: (reverse('export_wines'), {'data': {'selected_wines': f['lots']}})),
+    'inventory:batch_edit_wines': ('post', True, lambda f: (reverse('batch_edit_wines'), {'data': {
+        'selected_wines': ','.join(map(str, f['lots'])), 'status': 'reserved'}})),
+    'inventory:wine_list_index': ('get', True, lambda f: (reverse('wine_list_index'), {})),
+    'inventory:create_wine_list': ('post', True, lambda f: (reverse('create_wine_list'), _json({
+        'name': 'Benchmark', 'items': [{'inventory_id': pk, 'offer_qty': 1} for pk in f['lots'][:50]]}))),
+    'inventory:update_wine_list_status': ('post', True, lambda f: (reverse('update_wine_list_status'), _json({
+        'uuids': [f['wine_list'].uuid], 'status': 'confirmed'}))),
+    'inventory:export_wine_lists_zip': ('post', True, lambda f: (reverse('export_wine_lists_zip'), {
+        'data': {'uuids': [str(f['wine_list'].uuid)], 'engine': PDF_ENGINE}})),
+    'inventory:admin_amend_wine_list': ('post', True, lambda f: (
+        reverse('admin_amend_wine_list', args=[f['wine_list'].uuid]), _json({'items': [
+            {'item_id': item['id'], 'offer_price': float(item['offer_price']), 'accept_qty': 1}
+            for item in f['items']]}))),
+    'inventory:wine_list': ('get', True, lambda f: (reverse('wine_list', args=[f['wine_list'].uuid]), {})),
+    'inventory:export_wine_list_pdf': ('get', True, lambda f: (
+        reverse('export_wine_list_pdf', args=[f['wine_list'].uuid]), {'data': {'engine': PDF_ENGINE}})),
+    'inventory:enqueue_job': ('post', True, lambda f: (reverse('enqueue_job'), _json({
+        'kind': 'export_inventory', 'params': {'inventory_ids': f['lots']}}))),
+    'inventory:job_status': ('get', True, lambda f: (reverse('job_status', args=[f['job'].uuid]), {})),
+    'inventory:job_download': ('get', True, lambda f: (reverse('job_download', args=[f['job'].uuid]), {})),
+    'client_portal:input_wine_list_id': ('get', False, lambda f: (reverse('input_wine_list_id'), {})),
+    'client_portal:client_wine_list': (
+        'get', False, lambda f: (reverse('client_wine_list', args=[f['wine_list'].uuid]), {})),
+    'client_portal:client_wine_list_json': (
+        'get', False, lambda f: (reverse('client_wine_list_json', args=[f['wine_list'].uuid]), {})),
+    'client_portal:client_submit_wine_list': ('post', False, lambda f: (
+        reverse('client_submit_wine_list', args=[f['wine_list'].uuid]), _json({'items': [
+            {'item_id': item['id'], 'accept_qty': 1} for item in f['items']]}))),
+}
+
+
+def url_keys():
+    """'app:name' (or 'app:route' for unnamed patterns) of every URL the apps define."""
+    return [
+        f"{app}:{pattern.name or str(pattern.pattern) or 'root'}"
+        for app, urlconf in URLCONFS.items()
+        for pattern in urlconf.urlpatterns
+        if isinstance(pattern, URLPattern)
+    ]
+
+
+def pdf_engine_problem(engine):
+    """Why `engine` cannot render on this machine (a missing library), or None."""
+    try:
+        pdf.render(engine, 'benchmark', [])
+    except (ImportError, OSError) as e:
+        return str(e)
+    return None
+
+
+def _growth(sizes, values):
+    """Exponent k of values ~ size**k between the smallest and largest dataset."""
+    if values[0] <= 0 or values[-1] <= 0 or sizes[-1] == sizes[0]:
+        return 0.0
+    return math.log(values[-1] / values[0]) / math.log(sizes[-1] / sizes[0])
+
+
+def query_scaling(sizes, queries):
+    if len(set(queries)) == 1:
+        return "O(1)"
+    return "O(n)" if _growth(sizes, queries) >= 0.5 else "grows"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every URL of inventory and client_portal on synthetic datasets of increasing size, in a "
+        "throwaway test database: wall time, SQL queries and response bytes. Fails when a view exceeds its "
+        "query or time budget, or regresses against the JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                            help='Dataset sizes, in wines (lots, lists and list items grow with it)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed requests per view and size (median kept)')
+        parser.add_argument('--views', nargs='+', default=None, help="Only these views, e.g. 'inventory:wine_list'")
+        parser.add_argument('--baseline', type=str, default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--time-tolerance', type=float, default=0.5,
+                            help='Allowed slowdown against the baseline (0.5 = 50%%)')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        missing = [key for key in url_keys() if key not in SCENARIOS]
+        if missing:
+            raise CommandError(f"❌ No benchmark scenario for: {', '.join(missing)}")
+        unbudgeted = [key for key in SCENARIOS if key not in QUERY_BUDGETS]
+        if unbudgeted:
+            raise CommandError(f"❌ No query budget for: {', '.join(unbudgeted)}")
+        keys = options['views'] or url_keys()
+        unknown = set(keys) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"❌ Unknown view(s): {', '.join(sorted(unknown))}")
+        sizes = sorted(options['sizes'])
+        unavailable = pdf_engine_problem(PDF_ENGINE) if PDF_SCENARIOS & set(keys) else None
+        if unavailable:
+            self.stderr.write(self.style.WARNING(f"⚠️ PDF views skipped, {PDF_ENGINE} unavailable: {unavailable}"))
+            keys = [key for key in keys if key not in PDF_SCENARIOS]
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = self.run_benchmarks(keys, sizes, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        breaches = self.check_budgets(results, sizes, options)
+        self.report_scaling(results, sizes)
+
+        if options['update_baseline']:
+            baseline = Path(options['baseline'])
+            baseline.parent.mkdir(parents=True, exist_ok=True)
+            baseline.write_text(json.dumps({'sizes': sizes, 'views': results}, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"💾 Baseline written to {baseline}"))
+
+        if breaches:
+            raise CommandError(f"❌ {breaches} budget breach(es)")
+        self.stdout.write(self.style.SUCCESS("✅ All views within budget"))
+
+    def run_benchmarks(self, keys, sizes, repeat):
+        results = {key: {} for key in keys}
+        self.stdout.write(f"{'view':<42} {'size':>6} {'median ms':>10} {'queries':>8} {'KB':>9}")
+
+        for size in sizes:
+            call_command('flush', interactive=False, verbosity=0)
+            seeded = seed_synthetic(**_dataset(size))
+            user = get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+            fixtures = _fixtures()
+            self.stdout.write(self.style.HTTP_INFO(
+                f"📦 Size {size}: {seeded['lots']} lots, {seeded['wine_lists']} lists, "
+                f"{len(fixtures['items'])} items in the benchmarked list"))
+
+            for key in keys:
+                method, needs_login, build = SCENARIOS[key]
+                path, kwargs = build(fixtures)
+                # Served like vaguevin.wsgi does: the client portal through its lean stack
+                middleware = (settings.CLIENT_PORTAL_MIDDLEWARE if key.startswith('client_portal:')
+                              else settings.MIDDLEWARE)
+                with override_settings(MIDDLEWARE=middleware):
+                    result = self.measure(user if needs_login else None, method, path, kwargs, repeat)
+                expected = EXPECTED_STATUS.get(key, 200)
+                if result['status'] != expected:
+                    raise CommandError(
+                        f"❌ {key} at size {size}: HTTP {result['status']}, expected {expected}")
+                results[key][str(size)] = result
+                self.stdout.write(
+                    f"{key:<42} {size:>6} {result['ms']:>10.1f} {result['queries']:>8} "
+                    f"{result['bytes'] / 1024:>9.1f}")
+        return results
+
+    def measure(self, user, method, path, kwargs, repeat):
+        """Median wall time, queries and size of one request; its writes are rolled back."""
+        timings = []
+        for run in range(repeat + 1):  # the first run warms caches and is not timed
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(path, **kwargs)
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    elapsed = time.perf_counter() - started
+                response.close()
+                transaction.set_rollback(True)
+            if run:
+                timings.append(elapsed)
+        return {'ms': statistics.median(timings) * 1000, 'queries': len(queries), 'bytes': len(body),
+                'status': response.status_code}
+
+    def check_budgets(self, results, sizes, options):
+        baseline = {}
+        path = Path(options['baseline'])
+        if path.exists() and not options['update_baseline']:
+            baseline = json.loads(path.read_text()).get('views', {})
+
+        breaches = 0
+        for key, by_size in results.items():
+            for size, result in by_size.items():
+                problems = []
+                query_budget = QUERY_BUDGETS[key]
+                if result['queries'] > query_budget:
+                    problems.append(f"{result['queries']} queries > budget {query_budget}")
+                time_budget = TIME_BUDGETS_MS.get(key, DEFAULT_TIME_BUDGET_MS)
+                if result['ms'] > time_budget:
+                    problems.append(f"{result['ms']:.0f} ms > budget {time_budget} ms")
+
+                before = baseline.get(key, {}).get(size)
+                if before:
+                    if result['queries'] > before['queries']:
+                        problems.append(f"{result['queries']} queries, baseline {before['queries']}")
+                    if result['ms'] > before['ms'] * (1 + options['time_tolerance']):
+                        problems.append(f"{result['ms']:.0f} ms, baseline {before['ms']:.0f} ms")
+
+                for problem in problems:
+                    breaches += 1
+                    self.stdout.write(self.style.ERROR(f"❌ {key} at size {size}: {problem}"))
+        return breaches
+
+    def report_scaling(self, results, sizes):
+        self.stdout.write(self.style.HTTP_INFO("📈 Scaling between the smallest and largest dataset"))
+        for key, by_size in results.items():
+            measured = [size for size in sizes if str(size) in by_size]
+            if len(measured) < 2:
+                continue
+            queries = [by_size[str(size)]['queries'] for size in measured]
+            timings = [by_size[str(size)]['ms'] for size in measured]
+            scaling = query_scaling(measured, queries)
+            line = (f"{key:<42} queries {scaling:<6} ({' → '.join(map(str, queries))}), "
+                    f"time ~ n^{_growth(measured, timings):.2f}")
+            self.stdout.write(self.style.WARNING(line) if scaling != "O(1)" else line)
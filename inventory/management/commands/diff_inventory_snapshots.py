@@ -0,0 +1,76 @@
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importing import diff_snapshots, parse_sheet_date, parse_sheets, read_workbook
+
+DIFF_SHEETS = {'added': 'Added', 'removed': 'Removed', 'changed': 'Changed'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare two dated sheets of an inventory workbook (as read by import_inventory) and list the "
+        "added, removed and quantity/price-changed lots, as an Excel file or JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='Path to the Excel file')
+        parser.add_argument('old_sheet', nargs='?', help='Earlier sheet (default: second latest dated sheet)')
+        parser.add_argument('new_sheet', nargs='?', help='Later sheet (default: latest dated sheet)')
+        parser.add_argument('--output', type=str, default=None,
+                            help='Write the diff to this .xlsx or .json file (default: JSON on stdout)')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Processes parsing the two sheets (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        try:
+            data, sheet_names = read_workbook(options['file_path'])
+        except Exception as e:
+            raise CommandError(f"❌ Failed to read Excel file: {e}")
+
+        dated = sorted((name for name in sheet_names if parse_sheet_date(name)), key=parse_sheet_date)
+        if options['old_sheet'] and options['new_sheet']:
+            compared = [options['old_sheet'], options['new_sheet']]
+        elif len(dated) >= 2 and not options['old_sheet']:
+            compared = dated[-2:]
+        else:
+            raise CommandError("❌ Give both sheets to compare, or use a workbook with at least two dated sheets")
+        missing = [name for name in compared if name not in sheet_names]
+        if missing:
+            raise CommandError(f"❌ Sheet(s) not found: {', '.join(missing)}. Available: {', '.join(sheet_names)}")
+
+        (old_name, _, old), (new_name, _, new) = parse_sheets(data, compared, options['processes'])
+
+        started = time.perf_counter()
+        diff = diff_snapshots(old, new)
+        elapsed = time.perf_counter() - started
+
+        output = options['output']
+        if output is None:
+            self.stdout.write(json.dumps(self.as_json(old_name, new_name, diff), ensure_ascii=False, indent=2))
+            return
+
+        if Path(output).suffix.lower() == '.json':
+            with open(output, 'w', encoding='utf-8') as json_file:
+                json.dump(self.as_json(old_name, new_name, diff), json_file, ensure_ascii=False, indent=2)
+        else:
+            with pd.ExcelWriter(output) as writer:
+                for kind, title in DIFF_SHEETS.items():
+                    diff[kind].to_excel(writer, sheet_name=title, index=False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {old_name} → {new_name}: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+            f"{len(diff['changed'])} changed lots (diffed in {elapsed:.3f}s), written to {output}"))
+
+    def as_json(self, old_name, new_name, diff):
+        def dated(sheet_name):
+            purchase_date = parse_sheet_date(sheet_name)
+            return {'sheet': sheet_name, 'date': purchase_date.isoformat() if purchase_date else None}
+
+        payload = {'old': dated(old_name), 'new': dated(new_name)}
+        for kind, frame in diff.items():
+            payload[kind] = json.loads(frame.to_json(orient='records', force_ascii=False))
+        return payload
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.dedupe import SIMILARITY_THRESHOLD, find_duplicates, merge_duplicates
+
+
+def _describe(wine):
+    pk, name, vintage = wine[:3]
+    return f"#{pk} {name} ({vintage or '-'})"
+
+
+class Command(BaseCommand):
+    help = (
+        "Find near-duplicate wines (same vintage, similar names such as 'Vv' vs 'Vieilles Vignes') "
+        "and optionally merge each group into one wine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                            help='Minimum trigram similarity (0-1) for two names to be duplicates')
+        parser.add_argument('--prefix', type=int, default=4,
+                            help='Only compare wines whose normalized names share this many leading characters')
+        parser.add_argument('--max-block', type=int, default=500,
+                            help='Largest group of wines compared at once; larger ones are split on a longer prefix')
+        parser.add_argument('--show', type=int, default=50,
+                            help='Groups to print (0 for all)')
+        parser.add_argument('--merge', action='store_true',
+                            help='Move the lots of each duplicate to the kept wine and delete the duplicates')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        groups, stats = find_duplicates(options['threshold'], options['prefix'], options['max_block'])
+        elapsed = time.perf_counter() - started
+
+        duplicates = sum(len(group['losers']) for group in groups)
+        self.stdout.write(self.style.WARNING(
+            f"🔍 Compared {stats['wines']} wines in {stats['blocks']} blocks in {elapsed:.2f}s: "
+            f"{len(groups)} duplicate group(s), {duplicates} wine(s) to merge"))
+
+        shown = groups if not options['show'] else groups[:options['show']]
+        for group in shown:
+            self.stdout.write(f"🍷 Keep {_describe(group['winner'])}")
+            for loser in group['losers']:
+                self.stdout.write(f"    ← {_describe(loser)} [{loser[3]:.2f}]")
+        if len(shown) < len(groups):
+            self.stdout.write(f"… {len(groups) - len(shown)} more group(s)")
+
+        if not options['merge'] or not groups:
+            return
+
+        result = merge_duplicates(groups)
+        for group in result['skipped']:
+            self.stdout.write(self.style.ERROR(
+                f"⚠️ Skipped {_describe(group['winner'])}: lots to combine are on a wine list"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Merged {result['merged']} wine(s): {result['repointed']} lot(s) moved, "
+            f"{result['combined']} combined into an existing lot"))
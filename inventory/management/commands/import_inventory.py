@@ -1,127 +1,152 @@
-import pandas as pd
-import re
-from django.core.management.base import BaseCommand
-from inventory.models import Wine
-from datetime import datetime
-
-# Map Excel couleur values to Wine model CATEGORY_CHOICES
-CATEGORY_MAPPING = {
-    'BLANC': 'white',
-    'WHITE': 'white',
-    'ROUGE': 'red',
-    'RED': 'red',
-    'ROSE': 'rose',
-    'ROSÉ': 'rose',
-    'CHAMPAGNE': 'champagne',
-    'ROSE CHAMPAGNE': 'rose_champagne',
-    'SPARKLING': 'sparkling',
-    'YELLOW': 'yellow',
-    'LIQUEUR': 'liqueur',
-    'DESSERT': 'dessert',
-    'FORTIFIED': 'fortified',
-    'ORANGE': 'orange'
-}
+import hashlib
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from inventory.importing import (  # noqa: F401
+    CATEGORY_MAPPING, accumulate_lots, bulk_write_lots, parse_sheet_date, parse_sheets, read_workbook, sheet_fingerprint,
+    stream_sheet,
+)
+from inventory.models import ImportSheet, Wine, WineInventory
+from inventory.naming import canonical_key
+
 
 class Command(BaseCommand):
-    help = "Import wines from a multi-sheet Excel file. Each sheet name is treated as inventory date."
+    help = "Import wines into Wine + WineInventory from a multi-sheet Excel file. Each sheet name is treated as inventory date."
+
+    # Called with the fraction of sheets done; set by the import_inventory job
+    progress = None
 
     def add_arguments(self, parser):
         parser.add_argument('file_path', type=str, help='Path to the Excel file')
+        parser.add_argument('--bulk', action='store_true',
+                            help='Write each sheet with bulk inserts in one transaction, printing a summary instead of every row')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT in --bulk mode, and rows held in memory with --stream')
+        parser.add_argument('--stream', action='store_true',
+                            help='Read rows lazily in --batch-size batches, for workbooks too large to load whole')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Processes parsing sheets in parallel (default: one per CPU)')
+        parser.add_argument('--source', type=str, default=None,
+                            help='Source recorded on the lots and part of their key (default: file name without extension)')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-import sheets even when their contents did not change')
 
     def handle(self, *args, **options):
         file_path = options['file_path']
+        source = options['source'] or Path(file_path).stem
+
+        if options['stream']:
+            self.import_stream(file_path, source, options['batch_size'])
+            return
 
         try:
-            xls = pd.ExcelFile(file_path)
+            data, sheet_names = read_workbook(file_path)
         except Exception as e:
-            self.stderr.write(self.style.ERROR(f"❌ Failed to read Excel file: {e}"))
-            return
+            raise CommandError(f"❌ Failed to read Excel file: {e}")
 
-        sheet_names = xls.sheet_names
         self.stdout.write(self.style.WARNING(f"📑 Found {len(sheet_names)} sheet(s): {', '.join(sheet_names)}"))
 
-        for sheet_name in sheet_names:
-            try:
-                purchase_date = datetime.strptime(sheet_name.strip(), "%Y-%m-%d").date()
-            except Exception:
-                purchase_date = None  # sheet name is not a date
-
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            df = df.fillna("")
-
-            self.stdout.write(self.style.HTTP_INFO(f"📥 Importing sheet: {sheet_name} ({len(df)} rows)"))
-
-            current_region = None
-            for _, row in df.iterrows():
-                article = str(row.get('ARTICLE', '')).strip()
-                couleur = str(row.get('COULEUR', '')).strip().upper()
-                vintage = str(row.get('MILLESIME', '')).strip()
-                size = str(row.get('CL', '')).strip()
-                qty = str(row.get('UNITÉS', '')).strip()
-                price_euro = str(row.get('PRICE EN EUROS', '')).replace('€', '').strip()
-
-                # Skip category/header rows
-                if not article or article.upper() in ["WHITE WINE 白葡萄酒", "RED WINE 紅葡萄酒"]:
-                    continue
-                elif article.upper() in [
-                    "CHAMPAGNE 香檳", "BURGUNDY 勃艮第", "LOIRE 魯瓦河", "VALLEY OF RHONE 隆河谷", "SAVOIE 薩瓦河"]:
-                    current_region = ''.join(char for char in article.upper() 
-                                             if char == " " or (char.isascii() and char.isalpha())).strip().title()
-                    continue
-
-                # Convert quantity
-                try:
-                    qty = int(float(qty))
-                except:
-                    continue
-
-                # Convert bottle size
-                try:
-                    size = int(float(size))
-                except:
-                    size = None
-
-                # Convert price
-                try:
-                    price_euro = float(price_euro.replace(",", "").replace("€", "")) if price_euro else 0
-                except:
-                    price_euro = 0
-
-                # Vintage handling — keep NV as string
-                if vintage.upper() == "NV":
-                    vintage_str = "NV"
-                else:
-                    try:
-                        vintage_str = str(int(float(vintage)))
-                    except:
-                        vintage_str = "-"
-
-                # Category mapping
-                category = CATEGORY_MAPPING.get(couleur, 'other')
-
-                article = article.title()
-                article = article.replace("Drc ", "DRC ")
-                article = article.replace("1Er ", "1er ")
-                article = article.replace("Vv ", "VV ")
-                article = article.replace("Jfm ", "JFM ")
-                article = article.replace("Jf ", "JF ")
-                article = re.sub(r" Vo\b", " VO", article)
-                article = article.replace(" Rdj", " RDJ")
-
-                wine = Wine.objects.create(
-                    name=article,
-                    category=category,
-                    vintage=vintage_str,
-                    bottle_size=size,
-                    region=current_region,
-                    purchase_price=price_euro,
-                    qty=qty,
-                    purchase_date=purchase_date,
-                    status="in_stock"
-                )
-
-                self.stdout.write(self.style.SUCCESS(f"✅ Imported: {wine.name} ({vintage_str}) Qty={qty}"))
-
-            self.stdout.write(self.style.SUCCESS(f"✅ Finished sheet: {sheet_name}"))
+        fingerprints = dict(ImportSheet.objects.filter(source=source).values_list('sheet_name', 'fingerprint'))
+
+        parsed = parse_sheets(data, sheet_names, options['processes'])
+        for done, (sheet_name, rows, lots) in enumerate(parsed, start=1):
+            purchase_date = parse_sheet_date(sheet_name)
+            fingerprint = sheet_fingerprint(lots)
+            if fingerprints.get(sheet_name) == fingerprint and not options['force']:
+                self.stdout.write(f"⏭️ Unchanged sheet {sheet_name}, skipped")
+                self.report_progress(done, len(sheet_names))
+                continue
+
+            self.stdout.write(self.style.HTTP_INFO(f"📥 Importing sheet: {sheet_name} ({rows} rows)"))
+
+            started = time.perf_counter()
+            if options['bulk']:
+                with transaction.atomic():
+                    imported, wines_created = bulk_write_lots(lots, purchase_date, source, options['batch_size'])
+                    self.record_sheet(source, sheet_name, fingerprint, imported)
+                elapsed = time.perf_counter() - started
+                rate = imported / elapsed if elapsed else 0
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Finished sheet {sheet_name}: {imported} lots, {wines_created} new wines "
+                    f"in {elapsed:.2f}s ({rate:,.0f} rows/s)"))
+            else:
+                imported = self.write_rows(lots, purchase_date, source)
+                self.record_sheet(source, sheet_name, fingerprint, imported)
+                self.stdout.write(self.style.SUCCESS(f"✅ Finished sheet {sheet_name}: {imported} wines imported."))
+            self.report_progress(done, len(sheet_names))
 
         self.stdout.write(self.style.SUCCESS("🍷 All sheets imported successfully"))
+
+    def import_stream(self, file_path, source, batch_size):
+        """Import every sheet batch by batch; memory is bounded by batch_size, not sheet size."""
+        try:
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+        except Exception as e:
+            raise CommandError(f"❌ Failed to read Excel file: {e}")
+
+        try:
+            self.stdout.write(self.style.WARNING(
+                f"📑 Found {len(workbook.sheetnames)} sheet(s): {', '.join(workbook.sheetnames)}"))
+
+            for done, worksheet in enumerate(workbook.worksheets, start=1):
+                sheet_name = worksheet.title
+                purchase_date = parse_sheet_date(sheet_name)
+                self.stdout.write(self.style.HTTP_INFO(f"📥 Streaming sheet: {sheet_name}"))
+
+                started = time.perf_counter()
+                rows = wines_created = 0
+                # Running totals per lot, so a lot repeated in a later batch adds to the earlier one
+                totals = {}
+                # Content hash of the batches; differs from the whole-sheet fingerprint,
+                # so a later non-streamed import of the sheet is never skipped wrongly
+                fingerprint = hashlib.sha256()
+                with transaction.atomic():
+                    for batch_rows, lots in stream_sheet(worksheet, batch_size):
+                        _, batch_wines = bulk_write_lots(
+                            accumulate_lots(lots, totals), purchase_date, source, batch_size)
+                        rows += batch_rows
+                        wines_created += batch_wines
+                        fingerprint.update(sheet_fingerprint(lots).encode())
+                    imported = len(totals)
+                    self.record_sheet(source, sheet_name, fingerprint.hexdigest(), imported)
+
+                elapsed = time.perf_counter() - started
+                rate = rows / elapsed if elapsed else 0
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Finished sheet {sheet_name}: {rows} rows, {imported} lots, {wines_created} new wines "
+                    f"in {elapsed:.2f}s ({rate:,.0f} rows/s)"))
+                self.report_progress(done, len(workbook.worksheets))
+        finally:
+            workbook.close()
+
+        self.stdout.write(self.style.SUCCESS("🍷 All sheets imported successfully"))
+
+    def report_progress(self, done, total):
+        if self.progress is not None:
+            self.progress(done / total)
+
+    def write_rows(self, lots, purchase_date, source):
+        for name, category, vintage, region, bottle_size, qty, purchase_price in lots.itertuples(index=False, name=None):
+            wine, _ = Wine.objects.get_or_create(
+                canonical_key=canonical_key(name, vintage),
+                defaults={'name': name, 'category': category, 'vintage': vintage, 'region': region},
+            )
+            WineInventory.objects.update_or_create(
+                wine=wine,
+                bottle_size=bottle_size,
+                purchase_date=purchase_date,
+                source=source,
+                defaults={'purchase_price': purchase_price, 'qty': qty},
+            )
+            self.stdout.write(self.style.SUCCESS(f"✅ {name} ({vintage}) Qty={qty}"))
+        return len(lots)
+
+    def record_sheet(self, source, sheet_name, fingerprint, lot_count):
+        ImportSheet.objects.update_or_create(
+            source=source, sheet_name=sheet_name,
+            defaults={'fingerprint': fingerprint, 'lot_count': lot_count},
+        )
@@ -1,8 +1,8 @@
 import pandas as pd
-import re
 from datetime import datetime
 from django.core.management.base import BaseCommand
 from inventory.models import Wine, WineInventory
+from inventory.naming import canonical_key, clean_name
 
 # Map Excel "COULEUR" to category codes
 CATEGORY_MAPPING = {
@@ -53,6 +53,9 @@ class Command(BaseCommand):
 
             current_region = None
             imported = 0
+            # Running (qty, value, prices, rows) per lot of this sheet: a repeated lot
+            # adds up, priced by quantity, instead of overwriting the earlier row
+            totals = {}
 
             for _, row in df.iterrows():
                 article = str(row.get('ARTICLE', '')).strip()
@@ -102,33 +105,36 @@ class Command(BaseCommand):
                 category = CATEGORY_MAPPING.get(couleur, 'other')
 
                 # Clean name
-                article = (
-                    article.title()
-                    .replace("Drc ", "DRC ")
-                    .replace("1Er ", "1er ")
-                    .replace("Vv ", "VV ")
-                    .replace("Jfm ", "JFM ")
-                    .replace("Jf ", "JF ")
-                )
-                article = re.sub(r" Vo\b", " VO", article)
-                article = article.replace(" Rdj", " RDJ")
+                article = clean_name(article)
 
-                # 1️⃣ Create or get Wine (definition)
+                # 1️⃣ Create or get Wine (definition), by canonical key
                 wine, _ = Wine.objects.get_or_create(
-                    name=article,
-                    category=category,
-                    vintage=vintage_str,
-                    region=current_region,
+                    canonical_key=canonical_key(article, vintage_str),
+                    defaults={
+                        'name': article,
+                        'category': category,
+                        'vintage': vintage_str,
+                        'region': current_region,
+                    },
                 )
 
-                # 2️⃣ Create inventory entry
-                WineInventory.objects.create(
+                total_qty, total_value, price_sum, rows = totals.get((wine.pk, size), (0, 0.0, 0.0, 0))
+                total_qty += qty
+                total_value += qty * price_euro
+                price_sum += price_euro
+                rows += 1
+                totals[(wine.pk, size)] = (total_qty, total_value, price_sum, rows)
+
+                # 2️⃣ Create or refresh inventory entry (lot key is unique)
+                WineInventory.objects.update_or_create(
                     wine=wine,
                     bottle_size=size,
-                    purchase_price=price_euro,
-                    qty=qty,
                     purchase_date=purchase_date,
-                    status="in_stock",
+                    source=None,
+                    defaults={
+                        'purchase_price': round(total_value / total_qty if total_qty > 0 else price_sum / rows, 2),
+                        'qty': total_qty,
+                    },
                 )
 
                 imported += 1
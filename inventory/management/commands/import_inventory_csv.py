@@ -0,0 +1,201 @@
+import csv
+import io
+import time
+from pathlib import Path
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from inventory.importing import (
+    RECORD_COLUMNS, accumulate_lots, bulk_write_lots, category_codes, copy_from_stdin, merge_repeated_lots, normalize_records,
+)
+from inventory.models import Wine, WineInventory
+from inventory.naming import canonical_key
+
+NUMBER = r"'^[0-9]+(\.[0-9]+)?$'"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a CSV or JSONL inventory dump (columns: " + ", ".join(RECORD_COLUMNS) + ") into "
+        "Wine + WineInventory. On PostgreSQL rows are streamed with COPY into a staging table and "
+        "merged with set-based SQL; other databases go through pandas and bulk upserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='Path to the CSV or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help='File format (default: from the extension, .jsonl/.ndjson or CSV)')
+        parser.add_argument('--source', type=str, default=None,
+                            help='Source of rows without one (default: file name without extension)')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows per chunk on databases without COPY')
+
+    def handle(self, *args, **options):
+        path = Path(options['file_path'])
+        if not path.is_file():
+            raise CommandError(f"❌ File not found: {path}")
+        file_format = options['format'] or ('jsonl' if path.suffix.lower() in ('.jsonl', '.ndjson') else 'csv')
+        source = options['source'] or path.stem
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                rows, lots, wines_created = self.copy_and_merge(path, file_format, source)
+            else:
+                rows, lots, wines_created = self.load_in_chunks(path, file_format, source, options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Loaded {rows} rows into {lots} lots ({wines_created} new wines) "
+            f"in {elapsed:.2f}s ({rate:,.0f} rows/s)"))
+
+    # -----------------------------------
+    # PostgreSQL: COPY + set-based merge
+    # -----------------------------------
+
+    def copy_and_merge(self, path, file_format, source):
+        wine_table = connection.ops.quote_name(Wine._meta.db_table)
+        inventory_table = connection.ops.quote_name(WineInventory._meta.db_table)
+        mapping = category_codes()
+
+        with connection.cursor() as cursor, open(path, encoding='utf-8-sig', newline='') as dump:
+            cursor.execute(
+                "CREATE TEMP TABLE inventory_staging ("
+                + ", ".join(f"{column} text" for column in RECORD_COLUMNS)
+                + ") ON COMMIT DROP"
+            )
+            if file_format == 'csv':
+                header = next(csv.reader([dump.readline()]), [])
+                columns = [column.strip() for column in header]
+                unknown = set(columns) - set(RECORD_COLUMNS)
+                if unknown or 'name' not in columns or 'qty' not in columns:
+                    raise CommandError(
+                        f"❌ CSV header must use {', '.join(RECORD_COLUMNS)} (with name and qty); "
+                        f"got {', '.join(columns)}")
+                copy_from_stdin(
+                    cursor, f"COPY inventory_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", dump)
+            else:
+                # One JSON document per line; the control-character quote/delimiter keep COPY
+                # from interpreting anything inside the JSON text
+                cursor.execute("CREATE TEMP TABLE inventory_staging_json (doc jsonb) ON COMMIT DROP")
+                copy_from_stdin(cursor, "COPY inventory_staging_json (doc) FROM STDIN "
+                                        "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')", dump)
+                cursor.execute(
+                    f"INSERT INTO inventory_staging ({', '.join(RECORD_COLUMNS)}) "
+                    f"SELECT {', '.join(f'doc->>%s' for _ in RECORD_COLUMNS)} FROM inventory_staging_json",
+                    RECORD_COLUMNS,
+                )
+
+            cursor.execute("SELECT count(*) FROM inventory_staging")
+            rows = cursor.fetchone()[0]
+
+            # Same rules as inventory.importing.normalize_records
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE inventory_staging_rows ON COMMIT DROP AS
+                SELECT trim(s.name) AS name,
+                       coalesce(m.code, 'other') AS category,
+                       CASE WHEN upper(trim(s.vintage)) = 'NV' THEN 'NV'
+                            WHEN trim(s.vintage) ~ {NUMBER} THEN trunc(trim(s.vintage)::numeric)::bigint::text
+                            ELSE '-' END AS vintage,
+                       nullif(trim(s.region), '') AS region,
+                       CASE WHEN trim(s.bottle_size) ~ {NUMBER}
+                            THEN trunc(trim(s.bottle_size)::numeric)::integer END AS bottle_size,
+                       trunc(trim(s.qty)::numeric)::integer AS qty,
+                       CASE WHEN p.price ~ '^-?[0-9]+(\\.[0-9]+)?$' THEN p.price::numeric ELSE 0 END AS price,
+                       CASE WHEN trim(s.purchase_date) ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}$'
+                            THEN trim(s.purchase_date)::date END AS purchase_date,
+                       coalesce(nullif(trim(s.source), ''), %s) AS source
+                FROM inventory_staging s
+                CROSS JOIN LATERAL (
+                    SELECT regexp_replace(coalesce(s.purchase_price, ''), '[€,[:space:]]', '', 'g') AS price
+                ) p
+                LEFT JOIN (VALUES {', '.join(['(%s, %s)'] * len(mapping))}) AS m (value, code)
+                    ON m.value = upper(trim(s.category))
+                WHERE coalesce(trim(s.name), '') <> '' AND trim(s.qty) ~ {NUMBER}
+                """,
+                [source] + [item for pair in mapping.items() for item in pair],
+            )
+
+            # Canonical keys come from inventory.naming: computed here once per distinct
+            # name and vintage, and copied back for the joins below
+            cursor.execute("SELECT DISTINCT name, vintage FROM inventory_staging_rows")
+            keys = io.StringIO()
+            csv.writer(keys).writerows(
+                (name, vintage, canonical_key(name, vintage)) for name, vintage in cursor.fetchall())
+            keys.seek(0)
+            cursor.execute(
+                "CREATE TEMP TABLE inventory_staging_keys (name text, vintage text, canonical_key text) "
+                "ON COMMIT DROP")
+            copy_from_stdin(cursor, "COPY inventory_staging_keys FROM STDIN WITH (FORMAT csv)", keys)
+            cursor.execute("CREATE INDEX ON inventory_staging_keys (name, vintage)")
+
+            # The first spelling of each new wine names it
+            cursor.execute(
+                f"""
+                INSERT INTO {wine_table} (canonical_key, name, category, vintage, region)
+                SELECT DISTINCT ON (k.canonical_key) k.canonical_key, r.name, r.category, r.vintage, r.region
+                FROM inventory_staging_rows r
+                JOIN inventory_staging_keys k USING (name, vintage)
+                ORDER BY k.canonical_key
+                ON CONFLICT (canonical_key) DO NOTHING
+                """
+            )
+            wines_created = cursor.rowcount
+
+            # Repeated lots merged; the lot key (wine, bottle_size, purchase_date, source) is inv_lot_key_uniq
+            cursor.execute(
+                f"""
+                INSERT INTO {inventory_table}
+                    (wine_id, bottle_size, qty, purchase_price, source, purchase_date, status, created_at, updated_at)
+                SELECT w.id, r.bottle_size, sum(r.qty),
+                       round(CASE WHEN sum(r.qty) > 0 THEN sum(r.qty * r.price) / sum(r.qty)
+                                  ELSE avg(r.price) END, 2),
+                       r.source, r.purchase_date, 'in_stock', now(), now()
+                FROM inventory_staging_rows r
+                JOIN inventory_staging_keys k USING (name, vintage)
+                JOIN {wine_table} w ON w.canonical_key = k.canonical_key
+                GROUP BY w.id, r.bottle_size, r.purchase_date, r.source
+                ON CONFLICT (wine_id, bottle_size, purchase_date, source) DO UPDATE
+                SET qty = EXCLUDED.qty, purchase_price = EXCLUDED.purchase_price, updated_at = EXCLUDED.updated_at
+                """
+            )
+            lots = cursor.rowcount
+
+            # ON COMMIT DROP only fires at the outermost commit: a second load in the
+            # same transaction (a caller's atomic block) would find the tables still there
+            cursor.execute(
+                "DROP TABLE IF EXISTS inventory_staging, inventory_staging_json, inventory_staging_rows, "
+                "inventory_staging_keys")
+
+        return rows, lots, wines_created
+
+    # -----------------------------------
+    # Other databases: pandas chunks + bulk upserts
+    # -----------------------------------
+
+    def load_in_chunks(self, path, file_format, source, batch_size):
+        if file_format == 'csv':
+            chunks = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=batch_size, encoding='utf-8-sig')
+        else:
+            chunks = pd.read_json(path, lines=True, dtype=False, convert_dates=False, chunksize=batch_size)
+
+        rows = wines_created = 0
+        # Running lot totals per (purchase_date, source): repeats in later chunks add up,
+        # as the GROUP BY of the COPY path does
+        totals = {}
+        for chunk in chunks:
+            rows += len(chunk)
+            records = normalize_records(chunk, source)
+            for (purchase_date, lot_source), group in records.groupby(
+                    ['purchase_date', 'source'], dropna=False, sort=False):
+                purchase_date = None if pd.isna(purchase_date) else purchase_date
+                lot_totals = totals.setdefault((purchase_date, lot_source), {})
+                _, created = bulk_write_lots(
+                    accumulate_lots(merge_repeated_lots(group), lot_totals), purchase_date, lot_source, batch_size)
+                wines_created += created
+        lots = sum(len(lot_totals) for lot_totals in totals.values())
+        return rows, lots, wines_created
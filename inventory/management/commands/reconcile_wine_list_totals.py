@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from inventory.models import WineList
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored item count and total value of every WineList from its items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('uuids', nargs='*', help='Only reconcile these wine lists')
+
+    def handle(self, *args, **options):
+        wine_lists = WineList.objects.all()
+        if options['uuids']:
+            wine_lists = wine_lists.filter(uuid__in=options['uuids'])
+
+        updated = wine_lists.refresh_totals()
+        self.stdout.write(self.style.SUCCESS(f"✅ Reconciled totals of {updated} wine list(s)."))
@@ -0,0 +1,103 @@
+import multiprocessing
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+
+from inventory import jobs
+
+
+# Seconds between housekeeping passes of an idle worker
+HOUSEKEEPING_INTERVAL = 60
+
+
+def housekeeping(stale_after):
+    """Requeue the jobs of dead workers and purge expired jobs; returns (requeued, purged)."""
+    return (
+        jobs.requeue_stale_jobs(stale_after),
+        jobs.purge_finished_jobs(timedelta(seconds=settings.JOB_FILES_MAX_AGE)),
+    )
+
+
+def _worker_loop(poll_interval, drain, stale_after):
+    """Claim and run jobs until stopped (or, with drain, until the queue is empty)."""
+    stopping = False
+    last_housekeeping = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        try:
+            job = jobs.claim_next_job()
+        except DatabaseError:
+            # Transient (lost connection, lock timeout): reconnect and retry
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+        if job is None:
+            if drain:
+                break
+            if time.monotonic() - last_housekeeping >= HOUSEKEEPING_INTERVAL:
+                last_housekeeping = time.monotonic()
+                try:
+                    housekeeping(stale_after)
+                except DatabaseError:
+                    connections.close_all()
+            time.sleep(poll_interval)
+            continue
+        jobs.run_job(job)
+
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background job workers: a pool of processes dequeuing inventory.Job rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOB_WORKER_PROCESSES,
+                            help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Requeue running jobs whose worker sent no heartbeat for this many seconds '
+                                 f'(workers beat every {jobs.HEARTBEAT_SECONDS}s)')
+        parser.add_argument('--drain', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+        requeued, purged = housekeeping(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"♻️ Requeued {requeued} stale job(s)"))
+        if purged:
+            self.stdout.write(f"🧹 Purged {purged} expired job(s) and their files")
+
+        # Forked children must open their own database connections
+        connections.close_all()
+
+        workers = [
+            multiprocessing.Process(
+                target=_worker_loop, args=(options['poll_interval'], options['drain'], stale_after), daemon=False)
+            for _ in range(max(1, options['processes']))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f"👷 Started {len(workers)} worker process(es)"))
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Children got the same SIGINT and stop after their current job
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS("✅ Workers stopped"))
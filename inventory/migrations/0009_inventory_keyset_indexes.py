@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0008_alter_wineinventory_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["name", "id"], name="wine_name_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["vintage", "id"], name="wine_vintage_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["category", "id"], name="wine_category_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["region", "id"], name="wine_region_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wineinventory",
+            index=models.Index(fields=["status", "id"], name="inv_status_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wineinventory",
+            index=models.Index(
+                fields=["bottle_size", "id"], name="inv_bottle_size_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wineinventory",
+            index=models.Index(
+                fields=["purchase_price", "id"], name="inv_price_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wineinventory",
+            index=models.Index(fields=["qty", "id"], name="inv_qty_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="wineinventory",
+            index=models.Index(fields=["source", "id"], name="inv_source_id_idx"),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+# IMMUTABLE wrapper so the search document can be used in an expression index;
+# the two-argument unaccent() with an explicit dictionary is safe to mark as such.
+CREATE_SEARCH_DOCUMENT = """
+CREATE OR REPLACE FUNCTION wine_search_document(name text, region text, appellation text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, concat_ws(' ', name, region, appellation)))
+$$;
+"""
+
+CREATE_SEARCH_INDEX = """
+CREATE INDEX IF NOT EXISTS wine_search_trgm_idx ON inventory_wine
+USING gin (wine_search_document(name, region, appellation) gin_trgm_ops);
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return  # inventory.search falls back to Python-side trigram scoring
+    schema_editor.execute(CREATE_SEARCH_DOCUMENT)
+    schema_editor.execute(CREATE_SEARCH_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS wine_search_trgm_idx;")
+    schema_editor.execute("DROP FUNCTION IF EXISTS wine_search_document(text, text, text);")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0009_inventory_keyset_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:38
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    WineList = apps.get_model("inventory", "WineList")
+    WineItem = apps.get_model("inventory", "WineItem")
+    items = WineItem.objects.filter(wine_list=OuterRef("pk")).order_by().values("wine_list")
+    line_value = F("offer_price") * Coalesce(F("accept_qty"), F("offer_qty"))
+    WineList.objects.update(
+        item_count=Coalesce(Subquery(items.annotate(n=Count("id")).values("n")), 0),
+        items_value=Coalesce(
+            Subquery(items.annotate(v=Sum(line_value)).values("v")),
+            Value(Decimal("0")),
+            output_field=models.DecimalField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0010_wine_search_trigram_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="winelist",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="winelist",
+            name="items_value",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0"), max_digits=14
+            ),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:50
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def weighted_price(lots):
+    """Qty-weighted purchase price of (price, qty) pairs; unpriced lots are ignored."""
+    priced = [(price, qty) for price, qty in lots if price is not None]
+    if not priced:
+        return None
+    total = sum(qty for _, qty in priced)
+    if total:
+        price = sum(price * qty for price, qty in priced) / total
+    else:
+        price = sum(price for price, _ in priced) / len(priced)
+    return price.quantize(Decimal("0.01"))
+
+
+def dedupe_lots(apps, schema_editor):
+    """
+    Earlier imports created a new lot on every run. Fold the copies of each
+    (wine, bottle_size, purchase_date, source) into one lot holding their summed
+    qty at a qty-weighted price. Copies a wine list references cannot be
+    deleted: the newest of them is the one kept, the others keep their qty and
+    have their source marked with their id.
+    """
+    WineInventory = apps.get_model("inventory", "WineInventory")
+    WineItem = apps.get_model("inventory", "WineItem")
+    max_length = WineInventory._meta.get_field("source").max_length
+
+    by_key = defaultdict(list)
+    for pk, *key, qty, price in (
+        WineInventory.objects.order_by("-id")
+        .values_list(
+            "id",
+            "wine_id",
+            "bottle_size",
+            "purchase_date",
+            "source",
+            "qty",
+            "purchase_price",
+        )
+        .iterator()
+    ):
+        by_key[tuple(key)].append((pk, qty, price))
+    groups = [(key, lots) for key, lots in by_key.items() if len(lots) > 1]
+
+    referenced = set(
+        WineItem.objects.filter(
+            inventory_id__in=[pk for _, lots in groups for pk, _, _ in lots]
+        ).values_list("inventory_id", flat=True)
+    )
+    for (*_, source), lots in groups:
+        survivor = next((lot for lot in lots if lot[0] in referenced), lots[0])
+        absorbed = [
+            lot for lot in lots if lot is not survivor and lot[0] not in referenced
+        ]
+        kept = [lot for lot in lots if lot is not survivor and lot[0] in referenced]
+
+        if absorbed:
+            folded = [survivor, *absorbed]
+            WineInventory.objects.filter(pk=survivor[0]).update(
+                qty=sum(qty for _, qty, _ in folded),
+                purchase_price=weighted_price((price, qty) for _, qty, price in folded),
+            )
+            WineInventory.objects.filter(pk__in=[pk for pk, _, _ in absorbed]).delete()
+        for pk, _, _ in kept:
+            suffix = f" #{pk}" if source else f"#{pk}"
+            WineInventory.objects.filter(pk=pk).update(
+                source=f"{(source or '')[:max_length - len(suffix)]}{suffix}"
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0012_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportSheet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        help_text="Workbook the sheet came from", max_length=255
+                    ),
+                ),
+                ("sheet_name", models.CharField(max_length=255)),
+                ("fingerprint", models.CharField(max_length=64)),
+                ("lot_count", models.PositiveIntegerField(default=0)),
+                ("imported_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(dedupe_lots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="wineinventory",
+            constraint=models.UniqueConstraint(
+                fields=("wine", "bottle_size", "purchase_date", "source"),
+                name="inv_lot_key_uniq",
+                nulls_distinct=False,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="importsheet",
+            constraint=models.UniqueConstraint(
+                fields=("source", "sheet_name"), name="import_sheet_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+from inventory.naming import canonical_key
+
+
+def populate_canonical_keys(apps, schema_editor):
+    """Key every wine; of near-duplicates sharing a key, the oldest keeps it."""
+    Wine = apps.get_model("inventory", "Wine")
+    taken = set()
+    batch = []
+    for wine in Wine.objects.order_by("id").only("id", "name", "vintage").iterator():
+        key = canonical_key(wine.name, wine.vintage)
+        if key in taken:
+            continue
+        taken.add(key)
+        wine.canonical_key = key
+        batch.append(wine)
+        if len(batch) >= 1000:
+            Wine.objects.bulk_update(batch, ["canonical_key"])
+            batch = []
+    Wine.objects.bulk_update(batch, ["canonical_key"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0013_import_lot_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wine",
+            name="canonical_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=300, null=True, unique=True
+            ),
+        ),
+        migrations.RunPython(populate_canonical_keys, migrations.RunPython.noop),
+    ]
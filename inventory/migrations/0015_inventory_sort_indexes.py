@@ -0,0 +1,78 @@
+from django.db import migrations, models
+from django.db.models import F
+
+# NULLS LAST in an index is PostgreSQL-only (SQLite rejects it), so these are
+# recorded in the model state everywhere but only created on PostgreSQL.
+DESC_INDEXES = {
+    "wine": [
+        models.Index(F("name").desc(nulls_last=True), name="wine_name_desc_idx"),
+    ],
+    "wineinventory": [
+        models.Index(
+            F("status").desc(nulls_last=True), F("id").desc(), name="inv_status_desc_idx"
+        ),
+        models.Index(
+            F("bottle_size").desc(nulls_last=True),
+            F("id").desc(),
+            name="inv_bottle_size_desc_idx",
+        ),
+        models.Index(
+            F("purchase_price").desc(nulls_last=True),
+            F("id").desc(),
+            name="inv_price_desc_idx",
+        ),
+        models.Index(
+            F("qty").desc(nulls_last=True), F("id").desc(), name="inv_qty_desc_idx"
+        ),
+        models.Index(
+            F("source").desc(nulls_last=True), F("id").desc(), name="inv_source_desc_idx"
+        ),
+    ],
+}
+
+
+def add_desc_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model_name, indexes in DESC_INDEXES.items():
+        model = apps.get_model("inventory", model_name)
+        for index in indexes:
+            schema_editor.add_index(model, index)
+
+
+def remove_desc_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model_name, indexes in DESC_INDEXES.items():
+        model = apps.get_model("inventory", model_name)
+        for index in indexes:
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0014_wine_canonical_key"),
+    ]
+
+    operations = [
+        # The API orders by wine.<column>, then the lot id: (column, wine.id)
+        # indexes never matched that ORDER BY
+        migrations.RemoveIndex(model_name="wine", name="wine_name_id_idx"),
+        migrations.RemoveIndex(model_name="wine", name="wine_vintage_id_idx"),
+        migrations.RemoveIndex(model_name="wine", name="wine_category_id_idx"),
+        migrations.RemoveIndex(model_name="wine", name="wine_region_id_idx"),
+        migrations.AddIndex(
+            model_name="wine",
+            index=models.Index(fields=["name"], name="wine_name_idx"),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, indexes in DESC_INDEXES.items()
+                for index in indexes
+            ],
+            database_operations=[
+                migrations.RunPython(add_desc_indexes, remove_desc_indexes),
+            ],
+        ),
+    ]
@@ -1,11 +1,14 @@
 import uuid
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
-from django.db import models
-from django.db.models import F, Sum, Value
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .naming import canonical_key
+
 # Create your models here.
 
 
@@ -59,6 +62,27 @@ STATUS_CHOICES = [
 ]
 
 
+class WineQuerySet(models.QuerySet):
+
+    def refresh_canonical_keys(self):
+        """
+        Recompute canonical_key after bulk changes to name or vintage. A wine whose
+        new key is already held by another wine gets None, like in save().
+        """
+        wines = sorted(self.only('id', 'name', 'vintage'), key=lambda wine: wine.pk)
+        ids = [wine.pk for wine in wines]
+        keys = {wine.pk: canonical_key(wine.name, wine.vintage) for wine in wines}
+
+        self.model.objects.filter(pk__in=ids).update(canonical_key=None)
+        taken = set(self.model.objects.filter(
+            canonical_key__in=set(keys.values())).values_list('canonical_key', flat=True))
+        for wine in wines:
+            key = keys[wine.pk]
+            wine.canonical_key = None if key in taken else key
+            taken.add(key)
+        return self.model.objects.bulk_update(wines, ['canonical_key'], batch_size=1000)
+
+
 class Wine(models.Model):
     name = models.CharField(max_length=255)
     vintage = models.CharField(max_length=10, blank=True, null=True)  # NV or year
@@ -69,13 +93,35 @@ class Wine(models.Model):
     rating = models.CharField(max_length=50, blank=True, null=True,
                               help_text="Critic or personal rating")
     note = models.TextField(blank=True, null=True)
+    # One per wine across spellings (see inventory.naming); null on the later
+    # rows of near-duplicates found when the column was added
+    canonical_key = models.CharField(max_length=300, unique=True, blank=True, null=True, editable=False)
+
+    objects = WineQuerySet.as_manager()
 
     class Meta:
         ordering = ['name', 'vintage']
+        indexes = [
+            # The inventory table sorted by name walks these and joins the lots in
+            # order (the lot id tie-break is an incremental sort). DESC NULLS LAST
+            # is created on PostgreSQL only (migration 0015): SQLite lacks it.
+            models.Index(fields=['name'], name='wine_name_idx'),
+            models.Index(F('name').desc(nulls_last=True), name='wine_name_desc_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.vintage or 'NV'})"
 
+    def save(self, *args, **kwargs):
+        key = canonical_key(self.name, self.vintage)
+        if key != self.canonical_key:
+            # A near-duplicate already holding the key keeps it
+            taken = Wine.objects.filter(canonical_key=key).exclude(pk=self.pk).exists()
+            self.canonical_key = None if taken else key
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'canonical_key'}
+        super().save(*args, **kwargs)
+
 
 class WineInventory(models.Model):
     wine = models.ForeignKey(Wine, on_delete=models.CASCADE, related_name='inventories')
@@ -92,6 +138,32 @@ class WineInventory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the inventory table sorts on (column, id), with
+            # NULLS LAST both ways: a backward scan of the ascending index would
+            # give DESC NULLS FIRST, so descending sorts get their own index
+            # (PostgreSQL only, see migration 0015)
+            models.Index(fields=['status', 'id'], name='inv_status_id_idx'),
+            models.Index(fields=['bottle_size', 'id'], name='inv_bottle_size_id_idx'),
+            models.Index(fields=['purchase_price', 'id'], name='inv_price_id_idx'),
+            models.Index(fields=['qty', 'id'], name='inv_qty_id_idx'),
+            models.Index(fields=['source', 'id'], name='inv_source_id_idx'),
+            models.Index(F('status').desc(nulls_last=True), F('id').desc(), name='inv_status_desc_idx'),
+            models.Index(F('bottle_size').desc(nulls_last=True), F('id').desc(), name='inv_bottle_size_desc_idx'),
+            models.Index(F('purchase_price').desc(nulls_last=True), F('id').desc(), name='inv_price_desc_idx'),
+            models.Index(F('qty').desc(nulls_last=True), F('id').desc(), name='inv_qty_desc_idx'),
+            models.Index(F('source').desc(nulls_last=True), F('id').desc(), name='inv_source_desc_idx'),
+        ]
+        constraints = [
+            # Natural lot key: importers upsert on it (see inventory.importing.LOT_KEY_FIELDS)
+            models.UniqueConstraint(
+                fields=['wine', 'bottle_size', 'purchase_date', 'source'],
+                name='inv_lot_key_uniq',
+                nulls_distinct=False,
+            ),
+        ]
+
     def __str__(self):
         return f"{self.wine} — {self.bottle_size or '?'}cl [{self.status}]"
 
@@ -102,6 +174,31 @@ class WineInventory(models.Model):
         return None
 
 
+def _line_value_expression():
+    """SQL for one WineItem's value: offer_price * (accept_qty or offer_qty)."""
+    return F('offer_price') * Coalesce(F('accept_qty'), F('offer_qty'))
+
+
+class WineListQuerySet(models.QuerySet):
+
+    def apply_item_delta(self, wine_list_id, count=0, value=0):
+        """Shift the stored totals of one list by the change in its items."""
+        return self.filter(pk=wine_list_id).update(
+            item_count=F('item_count') + count,
+            items_value=F('items_value') + value,
+        )
+
+    def refresh_totals(self):
+        """Recompute the stored totals of every list in the queryset in one UPDATE."""
+        items = WineItem.objects.filter(wine_list=OuterRef('pk')).order_by().values('wine_list')
+        return self.update(
+            item_count=Coalesce(Subquery(items.annotate(n=Count('id')).values('n')), 0),
+            items_value=Coalesce(
+                Subquery(items.annotate(v=Sum(_line_value_expression())).values('v')),
+                Value(Decimal('0')), output_field=models.DecimalField()),
+        )
+
+
 class WineList(models.Model):
     """
     Represents a curated list of wines proposed to or confirmed by a client.
@@ -126,6 +223,12 @@ class WineList(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_sent_to_client = models.BooleanField(default=False)
 
+    # Denormalized from items; maintained by WineItem writes (see inventory.signals)
+    item_count = models.PositiveIntegerField(default=0)
+    items_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+
+    objects = WineListQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
@@ -133,15 +236,59 @@ class WineList(models.Model):
         return f"{self.name} ({self.get_status_display()})"
 
     def total_value(self):
-        """Compute total retail value of wines in this list."""
-        total = self.items.aggregate(
-            total=Sum(F('offer_price') * Coalesce(F('accept_qty'), F('offer_qty')))
-        )['total']
-        return total or Decimal('0')
+        """Return total retail value of wines in this list."""
+        return self.items_value
 
     def total_items(self):
         """Return number of wines in this list."""
-        return self.items.count()
+        return self.item_count
+
+    def amend_items(self, changes, prices=False):
+        """
+        Apply posted {"item_id", "accept_qty"[, "offer_price"]} changes to this
+        list's items with one SELECT and one bulk UPDATE, and shift the totals.
+
+        accept_qty is capped at the offered quantity and, with `prices`,
+        offer_price floored at the lot's purchase price. Malformed entries and
+        items of other lists are skipped. Call it in a transaction holding this
+        list's row lock. Returns the number of items updated.
+        """
+        wanted = {}
+        for change in changes:
+            try:
+                item_id = int(change.get("item_id") or 0)
+                accept_qty = int(change.get("accept_qty", 0))
+                offer_price = Decimal(str(change.get("offer_price", 0))) if prices else None
+            except (AttributeError, TypeError, ValueError, InvalidOperation):
+                continue
+            if not item_id or accept_qty < 0 or (prices and not offer_price.is_finite()):
+                continue  # skip invalid
+            wanted[item_id] = (accept_qty, offer_price)
+
+        items = self.items.all()
+        if prices:
+            items = items.select_related('inventory')
+        items = items.in_bulk(wanted)
+
+        now = timezone.now()
+        fields = ['accept_qty', 'updated_at']
+        if prices:
+            fields.append('offer_price')
+        delta = Decimal('0')
+        for item_id, item in items.items():
+            accept_qty, offer_price = wanted[item_id]
+            if prices:
+                purchase_price = item.inventory.purchase_price or Decimal('0')
+                item.offer_price = max(offer_price.quantize(Decimal('0.01')), purchase_price)  # not below purchase
+            item.accept_qty = min(accept_qty, item.offer_qty)  # don't exceed offer
+            item.updated_at = now
+            delta += item.line_value() - item._committed_line_value
+            item._committed_line_value = item.line_value()
+
+        WineItem.objects.bulk_update(items.values(), fields=fields)
+        if delta:
+            WineList.objects.apply_item_delta(self.pk, value=delta)
+        return len(items)
 
 
 class WineItem(models.Model):
@@ -174,5 +321,80 @@ class WineItem(models.Model):
     def __str__(self):
         return f"{self.inventory.wine.name} ({self.quantity}x) – {self.price}€"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored line value so saves can apply a delta to the list totals
+        if {'offer_price', 'offer_qty', 'accept_qty'}.issubset(field_names):
+            instance._committed_line_value = instance.line_value()
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the item and its WineList totals (post_save) in one transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def line_value(self):
+        """offer_price * (accept_qty or offer_qty), as summed into WineList.items_value."""
+        qty = self.offer_qty if self.accept_qty is None else self.accept_qty
+        return (self.offer_price or Decimal('0')) * qty
+
     def subtotal(self):
         return self.price * self.quantity
+
+
+class ImportSheet(models.Model):
+    """
+    Fingerprint of the last imported contents of one workbook sheet, so
+    re-imports skip sheets that did not change.
+    """
+    source = models.CharField(max_length=255, help_text="Workbook the sheet came from")
+    sheet_name = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    lot_count = models.PositiveIntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'sheet_name'], name='import_sheet_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} / {self.sheet_name}"
+
+
+class Job(models.Model):
+    """
+    A unit of long-running work (import, PDF, export) queued for the run_workers command.
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    kind = models.CharField(max_length=50, help_text="Handler name in inventory.jobs")
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # Touched by the running worker (see inventory.jobs.run_job); stale means the worker is gone
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Dequeue scans only the (small) set of queued jobs, oldest first
+            models.Index(fields=['created_at'], condition=Q(status='queued'), name='job_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.uuid} [{self.status}]"
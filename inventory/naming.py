@@ -0,0 +1,84 @@
+"""
+Wine name normalization shared by the importers and the Wine.canonical_key column.
+
+clean_name fixes the display casing of supplier names ("drc la tache vv" ->
+"DRC La Tache VV"); canonical_key folds case, accents, punctuation and the
+spelled-out forms in ABBREVIATIONS into one key per wine and vintage. Both are
+driven by ABBREVIATIONS through a single compiled alternation regex each, and
+memoized: supplier sheets repeat the same names over and over.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+# Canonical spelling -> other spellings of the same words in supplier sheets
+ABBREVIATIONS = {
+    "DRC": ["Domaine de la Romanee Conti"],
+    "1er": ["Premier"],
+    "VV": ["Vieilles Vignes"],
+    "JFM": [],
+    "JF": [],
+    "VO": [],
+    "RDJ": [],
+}
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def fold(text):
+    """Lower-case, strip accents and turn punctuation into single spaces."""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def trigrams(text):
+    """pg_trgm-style trigram set: each folded word padded with two leading and one trailing space."""
+    grams = set()
+    for word in fold(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _alternation(words):
+    # Longest first, so "JFM" wins over "JF"
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+# Whole-word, case-insensitive match of the canonical spellings, for display names
+_DISPLAY_RE = re.compile(rf"\b({_alternation(ABBREVIATIONS)})\b", re.IGNORECASE)
+_DISPLAY = {canonical.casefold(): canonical for canonical in ABBREVIATIONS}
+
+# Whole-word match of every folded spelling, for keys
+_KEY = {
+    fold(spelling): fold(canonical)
+    for canonical, spellings in ABBREVIATIONS.items()
+    for spelling in [canonical, *spellings]
+}
+_KEY_RE = re.compile(rf"\b({_alternation(_KEY)})\b")
+
+
+@lru_cache(maxsize=65536)
+def clean_name(name):
+    """Title-case a wine name, keeping the usual abbreviations in their canonical case."""
+    return _DISPLAY_RE.sub(lambda m: _DISPLAY[m.group(0).casefold()], name.title())
+
+
+@lru_cache(maxsize=65536)
+def canonical_name(name):
+    return _KEY_RE.sub(lambda m: _KEY[m.group(0)], fold(name))
+
+
+@lru_cache(maxsize=1024)
+def canonical_vintage(vintage):
+    """"NV", a year, or "" when unknown ("-", blank or missing)."""
+    vintage = fold(vintage)
+    return "" if vintage in ("", "-") else vintage
+
+
+def canonical_key(name, vintage):
+    """Key identifying a wine across spellings: Wine.canonical_key."""
+    return f"{canonical_name(name)}|{canonical_vintage(vintage)}"
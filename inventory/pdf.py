@@ -0,0 +1,247 @@
+"""
+Wine list PDF rendering.
+
+Rendering works on plain rows (see wine_list_rows) rather than model
+instances, so it can run outside the request process, and so the rows can be
+hashed into a content address for inventory.pdf_cache.
+
+Two engines draw the same table: "weasyprint" lays out HTML/CSS, "reportlab"
+draws platypus tables directly and stays fast on lists with thousands of
+lines. The default is settings.WINE_LIST_PDF_ENGINE.
+"""
+import hashlib
+import html
+import io
+import json
+import multiprocessing
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Bump whenever the rendered layout changes, so cached PDFs are not reused
+PDF_TEMPLATE_VERSION = 1
+
+PDF_COLUMNS = ["Name", "Vintage", "Category", "Region", "Bottle Size (cl)", "Qty", "Note"]
+
+PDF_STYLE = """
+    table { border-collapse: collapse; width: 100%; }
+    th, td { border: 1px solid #ddd; padding: 8px; font-size: 12px; }
+    th { background-color: #f2f2f2; }
+"""
+
+
+def wine_list_title(wine_list):
+    return str(wine_list.name or wine_list.uuid)
+
+
+def rows_by_list(wine_list_ids):
+    """
+    One joined query returning, per wine list id, the PDF columns of every item plus
+    the item and inventory updated_at stamps that feed the cache key.
+    """
+    from .models import WineItem
+
+    items = WineItem.objects.filter(wine_list_id__in=wine_list_ids).values_list(
+        "wine_list_id",
+        "inventory__wine__name",
+        "inventory__wine__vintage",
+        "inventory__wine__category",
+        "inventory__wine__region",
+        "inventory__bottle_size",
+        "accept_qty",
+        "offer_qty",
+        "note",
+        "updated_at",
+        "inventory__updated_at",
+    )
+    rows = {wine_list_id: [] for wine_list_id in wine_list_ids}
+    for (wine_list_id, name, vintage, category, region, bottle_size,
+         accept_qty, offer_qty, note, item_updated, inventory_updated) in items:
+        rows[wine_list_id].append(
+            (name, vintage or "", category, region or "", bottle_size,
+             accept_qty or offer_qty, note or "", item_updated, inventory_updated))
+    return rows
+
+
+def wine_list_rows(wine_list):
+    return rows_by_list([wine_list.id])[wine_list.id]
+
+
+def cache_key(wine_list, rows, engine, language=None):
+    """Content address of a wine list PDF: its rows, timestamps, engine and template version."""
+    payload = json.dumps(
+        [PDF_TEMPLATE_VERSION, engine, language, str(wine_list.uuid), wine_list_title(wine_list),
+         wine_list.updated_at, rows],
+        cls=DjangoJSONEncoder,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_weasyprint(title, rows, language=None):
+    """Render the PDF bytes for `rows` (as returned by wine_list_rows) with WeasyPrint."""
+    from weasyprint import HTML
+
+    header = "".join(f"<th>{html.escape(col)}</th>" for col in PDF_COLUMNS)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape('' if value is None else str(value))}</td>"
+                         for value in row[:len(PDF_COLUMNS)]) + "</tr>"
+        for row in rows
+    )
+    document = f"""
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>{PDF_STYLE}</style>
+    </head>
+    <body>
+        <h2>Wine List: {html.escape(title)}</h2>
+        <table><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>
+    </body>
+    </html>
+    """
+
+    pdf_file = io.BytesIO()
+    HTML(string=document).write_pdf(pdf_file)
+    return pdf_file.getvalue()
+
+
+# Built-in Adobe CID font: covers CJK without shipping a TTF
+CJK_FONT = "STSong-Light"
+
+
+def _needs_cjk(language, texts):
+    if language and language.startswith("zh"):
+        return True
+    return any(unicodedata.east_asian_width(char) in ("W", "F") for text in texts for char in text)
+
+
+def render_reportlab(title, rows, language=None):
+    """Render the same table as render_weasyprint, drawn directly with reportlab platypus."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+    cells = [["" if value is None else str(value) for value in row[:len(PDF_COLUMNS)]] for row in rows]
+
+    font = "Helvetica"
+    if _needs_cjk(language, [title] + [cell for row in cells for cell in (row[0], row[3], row[6])]):
+        pdfmetrics.registerFont(UnicodeCIDFont(CJK_FONT))
+        font = CJK_FONT
+
+    cell_style = ParagraphStyle("cell", fontName=font, fontSize=9, leading=11)
+    title_style = ParagraphStyle("title", fontName=font, fontSize=16, leading=20)
+
+    # Only free-text columns wrap; Paragraph layout is the expensive part of a table
+    wrapped = (0, 3, 6)
+    data = [PDF_COLUMNS] + [
+        [Paragraph(html.escape(value), cell_style) if i in wrapped else value
+         for i, value in enumerate(row)]
+        for row in cells
+    ]
+
+    margin = 12 * mm
+    width = A4[0] - 2 * margin
+    table = LongTable(
+        data,
+        colWidths=[width * share for share in (0.30, 0.08, 0.10, 0.14, 0.10, 0.06, 0.22)],
+        repeatRows=1,
+    )
+    table.setStyle(TableStyle([
+        ("FONTNAME", (0, 0), (-1, -1), font),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#dddddd")),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("TOPPADDING", (0, 0), (-1, -1), 4),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+    ]))
+
+    pdf_file = io.BytesIO()
+    document = SimpleDocTemplate(pdf_file, pagesize=A4, leftMargin=margin, rightMargin=margin,
+                                 topMargin=margin, bottomMargin=margin, title=f"Wine List: {title}")
+    document.build([Paragraph(html.escape(f"Wine List: {title}"), title_style), Spacer(1, 4 * mm), table])
+    return pdf_file.getvalue()
+
+
+PDF_ENGINES = {
+    "weasyprint": render_weasyprint,
+    "reportlab": render_reportlab,
+}
+
+
+def resolve_engine(requested=None):
+    """The requested engine if known, else settings.WINE_LIST_PDF_ENGINE."""
+    from django.conf import settings
+
+    if requested in PDF_ENGINES:
+        return requested
+    return settings.WINE_LIST_PDF_ENGINE
+
+
+def render(engine, title, rows, language=None):
+    return PDF_ENGINES[engine](title, rows, language)
+
+
+def pdf_filename(title):
+    return f"WineList_{title.replace('/', '_')}.pdf"
+
+
+_RENDER_POOL = None
+
+
+def _render_pool():
+    """Process pool for rendering many PDFs at once, bounded by WINE_LIST_PDF_RENDER_PROCESSES."""
+    global _RENDER_POOL
+    if _RENDER_POOL is None:
+        from django.conf import settings
+
+        _RENDER_POOL = ProcessPoolExecutor(
+            max_workers=settings.WINE_LIST_PDF_RENDER_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),  # no inherited DB connections or locks
+        )
+    return _RENDER_POOL
+
+
+def get_or_render_many(wine_lists, engine=None, language=None):
+    """
+    Yield (wine_list, cache path) for every list, cached PDFs first and then the
+    rest as they finish rendering in the process pool.
+    """
+    from . import pdf_cache
+
+    engine = resolve_engine(engine)
+    all_rows = rows_by_list([wine_list.id for wine_list in wine_lists])
+    pending = {}
+    for wine_list in wine_lists:
+        rows = all_rows[wine_list.id]
+        key = cache_key(wine_list, rows, engine, language)
+        path = pdf_cache.get(key)
+        if path is not None:
+            yield wine_list, path
+        else:
+            future = _render_pool().submit(render, engine, wine_list_title(wine_list), rows, language)
+            pending[future] = (wine_list, key)
+
+    for future in as_completed(pending):
+        wine_list, key = pending[future]
+        yield wine_list, pdf_cache.put(key, future.result())
+
+
+def get_or_render(wine_list, rows=None, key=None, engine=None, language=None):
+    """Return the cache path of the wine list's PDF, rendering it on a miss."""
+    from . import pdf_cache
+
+    engine = resolve_engine(engine)
+    if rows is None:
+        rows = wine_list_rows(wine_list)
+    if key is None:
+        key = cache_key(wine_list, rows, engine, language)
+    path = pdf_cache.get(key)
+    if path is None:
+        path = pdf_cache.put(key, render(engine, wine_list_title(wine_list), rows, language))
+    return path
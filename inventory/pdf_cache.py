@@ -0,0 +1,77 @@
+"""
+On-disk cache of rendered wine list PDFs, addressed by inventory.pdf.cache_key.
+
+Entries are plain files named <key>.pdf under settings.WINE_LIST_PDF_CACHE_DIR.
+A hit refreshes the file's mtime, so eviction by age and then by total size
+(oldest first) behaves as an LRU.
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+def _cache_dir():
+    path = Path(settings.WINE_LIST_PDF_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get(key):
+    """Return the cached file path for `key`, or None on a miss."""
+    path = _cache_dir() / f"{key}.pdf"
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def put(key, data):
+    """Store `data` under `key` atomically, evict stale entries, and return the path."""
+    cache_dir = _cache_dir()
+    path = cache_dir / f"{key}.pdf"
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)  # concurrent writers of the same key race harmlessly
+    evict(keep=path)
+    return path
+
+
+def evict(keep=None):
+    """Drop entries older than the max age, then the oldest until under the size cap."""
+    max_age = settings.WINE_LIST_PDF_CACHE_MAX_AGE
+    max_bytes = settings.WINE_LIST_PDF_CACHE_MAX_BYTES
+    now = time.time()
+
+    entries = []
+    for entry in os.scandir(_cache_dir()):
+        if not entry.name.endswith(".pdf"):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if now - stat.st_mtime > max_age and entry.path != str(keep):
+            _unlink(entry.path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if entry_path == str(keep):
+            continue
+        _unlink(entry_path)
+        total -= size
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,90 @@
+"""
+Typo- and accent-tolerant search over Wine.name, region and appellation.
+
+On PostgreSQL the match runs against a pg_trgm GIN index over the
+wine_search_document(name, region, appellation) expression created in
+migration 0010. Other backends (SQLite in tests) fall back to the same trigram
+scoring computed in Python.
+"""
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Func, TextField
+
+from .models import Wine
+from .naming import fold, trigrams
+
+# Same as pg_trgm.word_similarity_threshold's default
+SIMILARITY_THRESHOLD = 0.6
+
+
+def normalize_query(text):
+    """Lower-case, strip accents and turn punctuation into word breaks."""
+    return fold(text)
+
+
+class SearchDocument(Func):
+    """SQL expression matching the GIN index: wine_search_document(name, region, appellation)."""
+    function = 'wine_search_document'
+    output_field = TextField()
+
+    def __init__(self, **extra):
+        super().__init__(F('name'), F('region'), F('appellation'), **extra)
+
+
+def word_similarity(query, document):
+    """Share of the query's trigrams found in the document (approximates pg_trgm word_similarity)."""
+    query_grams = trigrams(query)
+    if not query_grams:
+        return 0.0
+    return len(query_grams & trigrams(document)) / len(query_grams)
+
+
+def _uses_trigram_index():
+    return connection.vendor == 'postgresql'
+
+
+def _ranked_fallback(query, threshold):
+    scored = []
+    for pk, name, region, appellation in Wine.objects.values_list(
+            'id', 'name', 'region', 'appellation').iterator():
+        document = ' '.join(filter(None, (name, region, appellation)))
+        score = word_similarity(query, document)
+        if score >= threshold:
+            scored.append((score, pk))
+    scored.sort(key=lambda s: -s[0])
+    return scored
+
+
+def matching_wines(query, threshold=SIMILARITY_THRESHOLD):
+    """Unordered Wine queryset of search matches, usable as a subquery filter."""
+    query = normalize_query(query)
+    if _uses_trigram_index():
+        return Wine.objects.alias(document=SearchDocument()).filter(
+            document__trigram_word_similar=query)
+    return Wine.objects.filter(pk__in=[pk for _, pk in _ranked_fallback(query, threshold)])
+
+
+def search_wines(query, limit=50, threshold=SIMILARITY_THRESHOLD):
+    """
+    Return up to `limit` Wines matching `query`, best first, each with a `rank` attribute.
+    """
+    query = normalize_query(query)
+    if not query:
+        return []
+
+    if _uses_trigram_index():
+        return list(
+            Wine.objects.alias(document=SearchDocument())
+            .filter(document__trigram_word_similar=query)
+            .annotate(rank=TrigramWordSimilarity(query, 'document'))
+            .order_by('-rank', 'name', 'id')[:limit]
+        )
+
+    scored = _ranked_fallback(query, threshold)[:limit]
+    wines = Wine.objects.in_bulk([pk for _, pk in scored])
+    results = []
+    for score, pk in scored:
+        wine = wines[pk]
+        wine.rank = score
+        results.append(wine)
+    return results
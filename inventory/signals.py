@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Wine, WineInventory, WineItem, WineList
+
+
+@receiver(post_save, sender=WineItem)
+def add_item_to_list_totals(sender, instance, created, raw=False, **kwargs):
+    """Apply the change in one item's value to its WineList totals."""
+    if raw:
+        return
+    previous = getattr(instance, '_committed_line_value', None)
+    if not created and previous is None:
+        # Saved from an instance we never loaded: its old value is unknown
+        WineList.objects.filter(pk=instance.wine_list_id).refresh_totals()
+    else:
+        WineList.objects.apply_item_delta(
+            instance.wine_list_id,
+            count=1 if created else 0,
+            value=instance.line_value() - (previous or Decimal('0')),
+        )
+    instance._committed_line_value = instance.line_value()
+
+
+@receiver(post_delete, sender=WineItem)
+def remove_item_from_list_totals(sender, instance, **kwargs):
+    value = getattr(instance, '_committed_line_value', None)
+    WineList.objects.apply_item_delta(
+        instance.wine_list_id,
+        count=-1,
+        value=-(instance.line_value() if value is None else value),
+    )
+
+
+@receiver(post_save, sender=Wine)
+def stamp_lots_of_edited_wine(sender, instance, created, raw=False, **kwargs):
+    """Wine has no timestamp: move its lots' updated_at so client pages listing them revalidate."""
+    if raw or created:
+        return
+    WineInventory.objects.filter(wine=instance).update(updated_at=timezone.now())
@@ -0,0 +1,253 @@
+"""
+Synthetic wines, lots and wine lists for load and benchmark testing (see the
+seed_synthetic command).
+
+Everything is drawn column-wise from one seeded NumPy generator, so a seed
+always produces the same data. Categories and statuses follow the model
+choices, weighted towards what a real cellar holds; codes missing from the
+weight tables still appear, with weight 1.
+
+Rows are built as plain tuples. On PostgreSQL they are loaded with COPY, under
+ids reserved from the table's sequence; elsewhere they go through bulk_create.
+"""
+import csv
+import io
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .importing import copy_from_stdin
+from .models import CATEGORY_CHOICES, STATUS_CHOICES, Wine, WineInventory, WineItem, WineList
+from .naming import canonical_key
+
+CATEGORY_WEIGHTS = {
+    'red': 45, 'white': 25, 'champagne': 10, 'rose': 4, 'rose_champagne': 2, 'sparkling': 3,
+    'yellow': 1, 'liqueur': 1, 'dessert': 3, 'fortified': 2, 'orange': 1, 'other': 1,
+}
+STATUS_WEIGHTS = {
+    'in_stock': 55, 'in_bond': 15, 'sold': 12, 'reserved': 8, 'consumed': 5, 'proposed': 3, 'other': 2,
+}
+LIST_STATUS_WEIGHTS = {
+    'created': 40, 'submitted': 20, 'confirmed': 15, 'delivered': 10, 'finalized': 10, 'archived': 5,
+}
+
+APPELLATIONS = {
+    'Burgundy': ['Chambertin', 'Clos de Vougeot', 'Echezeaux', 'Richebourg', 'Vosne-Romanee', 'Meursault',
+                 'Puligny-Montrachet', 'Corton-Charlemagne', 'Chablis Grand Cru', 'Volnay'],
+    'Bordeaux': ['Pauillac', 'Margaux', 'Saint-Julien', 'Pomerol', 'Saint-Emilion', 'Pessac-Leognan',
+                 'Sauternes'],
+    'Champagne': ['Champagne', 'Champagne Grand Cru', 'Blanc de Blancs'],
+    'Rhone': ['Hermitage', 'Cote-Rotie', 'Chateauneuf-du-Pape', 'Cornas', 'Condrieu'],
+    'Loire': ['Sancerre', 'Pouilly-Fume', 'Savennieres', 'Vouvray'],
+    'Savoie': ['Chignin-Bergeron', 'Roussette de Savoie'],
+    'Jura': ['Chateau-Chalon', 'Arbois'],
+}
+PRODUCERS = [
+    'Domaine Rousseau', 'Domaine Leroy', 'DRC', 'Domaine Roumier', 'Comte Liger-Belair', 'Coche-Dury',
+    'Domaine Leflaive', 'Chateau Latour', 'Chateau Margaux', 'Chateau Lafite', 'Petrus', 'Krug',
+    'Salon', 'Jacques Selosse', 'Jean-Louis Chave', 'Guigal', 'Chateau Rayas', 'Didier Dagueneau',
+    'Domaine Huet', 'Jean-Francois Ganevat', 'Domaine Dujac', 'JF Mugnier', 'Bruno Clair', 'Fourrier',
+]
+CUVEES = ['', '', '', '', 'Vieilles Vignes', '1er Cru', 'Grand Cru', 'Cuvee Speciale', 'Reserve', 'VO']
+SOURCES = ['Cellar stock', 'Negociant A', 'Negociant B', 'Auction', 'Private collection']
+BOTTLE_SIZES = [75, 150, 37, 300]
+BOTTLE_SIZE_WEIGHTS = [80, 12, 6, 2]
+
+OLDEST_VINTAGE = 1970
+NEWEST_VINTAGE = 2022
+FIRST_PURCHASE = date(2015, 1, 1)
+PURCHASE_DAYS = 3652
+
+WINE_FIELDS = ['name', 'vintage', 'category', 'region', 'appellation', 'canonical_key']
+LOT_FIELDS = ['wine_id', 'bottle_size', 'qty', 'purchase_price', 'source', 'purchase_date', 'status']
+LIST_FIELDS = ['uuid', 'name', 'status', 'is_sent_to_client', 'item_count', 'items_value']
+ITEM_FIELDS = ['wine_list_id', 'inventory_id', 'offer_price', 'offer_qty', 'accept_qty']
+
+
+def _draw(rng, choices, weights, size):
+    codes = [code for code, _ in choices]
+    p = np.array([weights.get(code, 1) for code in codes], dtype=float)
+    return np.array(codes, dtype=object)[rng.choice(len(codes), size=size, p=p / p.sum())]
+
+
+def _pick(rng, values, size):
+    return np.array(values, dtype=object)[rng.integers(0, len(values), size)]
+
+
+def _prices(values):
+    return [Decimal(f"{value:.2f}") for value in values.tolist()]
+
+
+def make_wines(rng, count, taken=()):
+    """
+    WINE_FIELDS rows. Repeated name and vintage pairs, and keys in `taken`, get no
+    canonical_key, like real near-duplicates.
+    """
+    places = [(region, appellation) for region, names in APPELLATIONS.items() for appellation in names]
+    place_index = rng.integers(0, len(places), count)
+    regions = np.array([region for region, _ in places], dtype=object)[place_index]
+    appellations = np.array([appellation for _, appellation in places], dtype=object)[place_index]
+    producers = _pick(rng, PRODUCERS, count)
+    cuvees = _pick(rng, CUVEES, count)
+
+    # Recent vintages are the most common; some are NV or unknown
+    years = np.clip(NEWEST_VINTAGE - rng.geometric(0.1, count) + 1, OLDEST_VINTAGE, NEWEST_VINTAGE)
+    kind = rng.random(count)
+    vintages = np.where(kind < 0.05, 'NV', np.where(kind < 0.08, '-', years.astype(str))).tolist()
+
+    categories = _draw(rng, CATEGORY_CHOICES, CATEGORY_WEIGHTS, count)
+    categories[regions == 'Champagne'] = 'champagne'
+
+    rows = []
+    taken = set(taken)
+    for producer, appellation, cuvee, vintage, category, region in zip(
+            producers, appellations, cuvees, vintages, categories, regions):
+        name = f"{producer} {appellation} {cuvee}".strip()
+        key = canonical_key(name, vintage)
+        rows.append((name, vintage, category, region, appellation, None if key in taken else key))
+        taken.add(key)
+    return rows
+
+
+def make_lots(rng, wine_ids, count):
+    """
+    LOT_FIELDS rows over wine_ids, unique on the lot key (so possibly fewer than
+    count), with their prices and quantities as arrays for make_items.
+    """
+    wine_index = rng.integers(0, len(wine_ids), count)
+    size_index = rng.choice(len(BOTTLE_SIZES), size=count, p=np.array(BOTTLE_SIZE_WEIGHTS) / sum(BOTTLE_SIZE_WEIGHTS))
+    source_index = rng.integers(0, len(SOURCES), count)
+    days = rng.integers(0, PURCHASE_DAYS, count)
+
+    # Keep the first lot per (wine, bottle_size, purchase_date, source): inv_lot_key_uniq
+    lot_keys = ((wine_index * len(BOTTLE_SIZES) + size_index) * len(SOURCES) + source_index) * PURCHASE_DAYS + days
+    _, first = np.unique(lot_keys, return_index=True)
+    first.sort()
+    wine_index, size_index, source_index, days = wine_index[first], size_index[first], source_index[first], days[first]
+    count = len(first)
+
+    prices = np.round(rng.lognormal(mean=4.5, sigma=1.0, size=count) * np.array(BOTTLE_SIZES)[size_index] / 75, 2)
+    qtys = rng.geometric(0.25, count) - 1
+    statuses = _draw(rng, STATUS_CHOICES, STATUS_WEIGHTS, count)
+
+    rows = [
+        (wine_id, BOTTLE_SIZES[size], qty, price, SOURCES[source], FIRST_PURCHASE + timedelta(days=day), status)
+        for wine_id, size, qty, price, source, day, status in zip(
+            np.asarray(wine_ids)[wine_index].tolist(), size_index.tolist(), qtys.tolist(), _prices(prices),
+            source_index.tolist(), days.tolist(), statuses)
+    ]
+    return rows, prices, qtys
+
+
+def make_wine_lists(rng, count):
+    """LIST_FIELDS rows, totals zero until refresh_totals, with their statuses."""
+    statuses = _draw(rng, WineList.STATUS_CHOICES, LIST_STATUS_WEIGHTS, count)
+    sent = (rng.random(count) < 0.7) | (statuses != 'created')
+    rows = [
+        (uuid.UUID(bytes=rng.bytes(16), version=4), f"Synthetic offer {index + 1}", status, is_sent,
+         0, Decimal('0'))
+        for index, (status, is_sent) in enumerate(zip(statuses, sent.tolist()))
+    ]
+    return rows, statuses
+
+
+def make_items(rng, list_ids, list_statuses, lot_ids, lot_prices, lot_qtys, per_list):
+    """ITEM_FIELDS rows: about per_list distinct lots per list, offered above purchase price."""
+    sizes = np.maximum(rng.poisson(per_list, len(list_ids)), 1)
+    list_index = np.repeat(np.arange(len(list_ids)), sizes)
+    lot_index = rng.integers(0, len(lot_ids), len(list_index))
+
+    # One item per (list, lot): unique_together
+    _, first = np.unique(list_index * len(lot_ids) + lot_index, return_index=True)
+    list_index, lot_index = list_index[first], lot_index[first]
+    count = len(first)
+
+    offer_prices = np.round(lot_prices[lot_index] * rng.uniform(1.15, 1.8, count), 2)
+    offer_qtys = np.minimum(rng.integers(1, 13, count), np.maximum(lot_qtys[lot_index], 1))
+
+    # Lists past client review carry the client's answer on some lines
+    answered = (list_statuses[list_index] != 'created') & (rng.random(count) < 0.4)
+    accept_qtys = np.minimum(rng.integers(0, 13, count), offer_qtys)
+
+    return [
+        (list_id, lot_id, price, offer_qty, accept_qty if is_answered else None)
+        for list_id, lot_id, price, offer_qty, accept_qty, is_answered in zip(
+            np.asarray(list_ids)[list_index].tolist(), np.asarray(lot_ids)[lot_index].tolist(),
+            _prices(offer_prices), offer_qtys.tolist(), accept_qtys.tolist(), answered.tolist())
+    ]
+
+
+def insert_rows(model, fields, rows, batch_size):
+    """
+    Insert `rows` (tuples of `fields` values) and return their new ids, in order.
+    auto_now and auto_now_add columns are set to the current time.
+    """
+    if not rows:
+        return []
+    if connection.vendor != 'postgresql':
+        created = model.objects.bulk_create(
+            [model(**dict(zip(fields, row))) for row in rows], batch_size=batch_size)
+        return [instance.pk for instance in created]
+
+    meta = model._meta
+    stamped = [field.column for field in meta.concrete_fields
+               if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    stamps = [timezone.now().isoformat()] * len(stamped)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [meta.db_table, meta.pk.column, len(rows)],
+        )
+        ids = [pk for pk, in cursor.fetchall()]
+
+        # Unquoted empty CSV fields are NULL; every text column here is either NULL or non-empty
+        dump = io.StringIO()
+        csv.writer(dump).writerows((pk, *row, *stamps) for pk, row in zip(ids, rows))
+        dump.seek(0)
+        columns = ', '.join(connection.ops.quote_name(column) for column in [
+            meta.pk.column, *(meta.get_field(field).column for field in fields), *stamped])
+        copy_from_stdin(
+            cursor,
+            f"COPY {connection.ops.quote_name(meta.db_table)} ({columns}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            dump,
+        )
+    return ids
+
+
+def seed_synthetic(wines, lots, lists, items_per_list=20, seed=0, batch_size=5000):
+    """
+    Insert the synthetic catalogue in one transaction; returns the number of rows
+    created per model. The rows skip the WineItem signals, so the list totals are
+    recomputed at the end.
+    """
+    rng = np.random.default_rng(seed)
+    with transaction.atomic():
+        taken = Wine.objects.exclude(canonical_key=None).values_list('canonical_key', flat=True)
+        wine_ids = insert_rows(Wine, WINE_FIELDS, make_wines(rng, wines, taken), batch_size)
+
+        lot_ids, lot_prices, lot_qtys = [], None, None
+        if wine_ids:
+            lot_rows, lot_prices, lot_qtys = make_lots(rng, wine_ids, lots)
+            lot_ids = insert_rows(WineInventory, LOT_FIELDS, lot_rows, batch_size)
+
+        list_rows, list_statuses = make_wine_lists(rng, lists)
+        list_ids = insert_rows(WineList, LIST_FIELDS, list_rows, batch_size)
+
+        item_ids = []
+        if list_ids and lot_ids:
+            item_ids = insert_rows(WineItem, ITEM_FIELDS, make_items(
+                rng, list_ids, list_statuses, lot_ids, lot_prices, lot_qtys, items_per_list), batch_size)
+            # A range rather than a huge IN list; refreshing a list in between is harmless
+            WineList.objects.filter(pk__range=(min(list_ids), max(list_ids))).refresh_totals()
+
+    return {
+        'wines': len(wine_ids),
+        'lots': len(lot_ids),
+        'wine_lists': len(list_ids),
+        'items': len(item_ids),
+    }
@@ -1,3 +1,854 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+
+from inventory import importing, jobs, pdf
+from inventory.dedupe import find_duplicates, merge_duplicates
+from inventory.exports import EXPORT_COLUMNS
+from inventory.models import ImportSheet, Job, Wine, WineInventory, WineItem, WineList
+from inventory.naming import canonical_key
+
+SHEET_HEADER = ['ARTICLE', 'COULEUR', 'MILLESIME', 'CL', 'UNITÉS', 'PRICE EN EUROS']
+
+
+def make_lot(name, vintage='2015', purchase_price=Decimal('100'), qty=6, **fields):
+    wine = Wine.objects.create(name=name, vintage=vintage, category='red')
+    return WineInventory.objects.create(wine=wine, purchase_price=purchase_price, qty=qty, bottle_size=75, **fields)
+
+
+def write_workbook(path, rows, sheet_name='2024-03-01'):
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = sheet_name
+    worksheet.append(SHEET_HEADER)
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(path)
+
+
+class WineListTotalsTests(TestCase):
+
+    def setUp(self):
+        self.wine_list = WineList.objects.create(name='Client A')
+        self.margaux = make_lot('Margaux')
+        self.pauillac = make_lot('Pauillac', purchase_price=Decimal('40'))
+
+    def assertTotals(self, count, value):
+        self.wine_list.refresh_from_db()
+        self.assertEqual(self.wine_list.item_count, count)
+        self.assertEqual(self.wine_list.items_value, Decimal(value))
+        # The stored totals match a full recount
+        WineList.objects.filter(pk=self.wine_list.pk).refresh_totals()
+        self.wine_list.refresh_from_db()
+        self.assertEqual(self.wine_list.item_count, count)
+        self.assertEqual(self.wine_list.items_value, Decimal(value))
+
+    def test_item_writes_keep_totals(self):
+        first = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=self.margaux, offer_price=Decimal('120'), offer_qty=3)
+        second = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=self.pauillac, offer_price=Decimal('50'), offer_qty=2)
+        self.assertTotals(2, '460')
+
+        first.accept_qty = 1
+        first.save()
+        self.assertTotals(2, '220')
+
+        # An instance loaded from the database carries its committed value
+        second = WineItem.objects.get(pk=second.pk)
+        second.offer_price = Decimal('55')
+        second.save()
+        self.assertTotals(2, '230')
+
+        second.delete()
+        self.assertTotals(1, '120')
+
+    def test_amend_items_caps_quantities_and_floors_prices(self):
+        first = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=self.margaux, offer_price=Decimal('120'), offer_qty=3)
+        second = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=self.pauillac, offer_price=Decimal('50'), offer_qty=2)
+        other_list = WineList.objects.create(name='Client B')
+        other = WineItem.objects.create(
+            wine_list=other_list, inventory=self.margaux, offer_price=Decimal('120'), offer_qty=3)
+
+        updated = self.wine_list.amend_items([
+            {'item_id': first.pk, 'accept_qty': 10, 'offer_price': 130},
+            {'item_id': second.pk, 'accept_qty': 1, 'offer_price': '10'},
+            {'item_id': other.pk, 'accept_qty': 1, 'offer_price': 1},
+            {'item_id': 'not a number', 'accept_qty': 1},
+            {'item_id': first.pk, 'accept_qty': -1},
+        ], prices=True)
+
+        self.assertEqual(updated, 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((first.accept_qty, first.offer_price), (3, Decimal('130')))
+        # Never offered below the purchase price of the lot
+        self.assertEqual((second.accept_qty, second.offer_price), (1, Decimal('40')))
+        self.assertIsNone(other.accept_qty)
+        self.assertTotals(2, '430')
+
+    def test_amend_items_without_prices_keeps_offer_prices(self):
+        item = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=self.margaux, offer_price=Decimal('120'), offer_qty=3)
+
+        self.wine_list.amend_items([{'item_id': item.pk, 'accept_qty': 2, 'offer_price': 1}])
+
+        item.refresh_from_db()
+        self.assertEqual((item.accept_qty, item.offer_price), (2, Decimal('120')))
+        self.assertTotals(1, '240')
+
+
+class ImportInventoryTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = Path(directory) / 'cellar.xlsx'
+        write_workbook(self.path, [
+            ['BURGUNDY 勃艮第', None, None, None, None, None],
+            ['Romanee Conti', 'ROUGE', 2015, 75, 3, '1200'],
+            ['Chablis', 'BLANC', 2020, 75, 6, '30'],
+            ['Romanee Conti', 'ROUGE', 2015, 75, 1, '1500'],
+        ])
+
+    def import_inventory(self, *args):
+        out = io.StringIO()
+        call_command('import_inventory', str(self.path), '--processes', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def lots(self):
+        return sorted(WineInventory.objects.values_list('wine__name', 'wine__region', 'qty', 'purchase_price'))
+
+    def test_repeated_lots_are_merged(self):
+        self.import_inventory('--bulk')
+
+        self.assertEqual(self.lots(), [
+            ('Chablis', 'Burgundy', 6, Decimal('30.00')),
+            ('Romanee Conti', 'Burgundy', 4, Decimal('1275.00')),
+        ])
+
+    def test_reimport_is_idempotent(self):
+        self.import_inventory('--bulk')
+        before = self.lots()
+
+        output = self.import_inventory('--bulk', '--force')
+
+        self.assertNotIn('Unchanged sheet', output)
+        self.assertEqual(self.lots(), before)
+        self.assertEqual(Wine.objects.count(), 2)
+
+    def test_unchanged_sheet_is_skipped(self):
+        self.import_inventory('--bulk')
+        WineInventory.objects.update(qty=0)
+
+        output = self.import_inventory('--bulk')
+
+        self.assertIn('Unchanged sheet 2024-03-01, skipped', output)
+        self.assertEqual(set(WineInventory.objects.values_list('qty', flat=True)), {0})
+
+    def test_changed_sheet_is_reimported(self):
+        self.import_inventory('--bulk')
+        write_workbook(self.path, [
+            ['BURGUNDY 勃艮第', None, None, None, None, None],
+            ['Romanee Conti', 'ROUGE', 2015, 75, 2, '1200'],
+            ['Chablis', 'BLANC', 2020, 75, 6, '30'],
+        ])
+
+        output = self.import_inventory('--bulk')
+
+        self.assertNotIn('Unchanged sheet', output)
+        self.assertEqual(WineInventory.objects.get(wine__name='Romanee Conti').qty, 2)
+        self.assertEqual(WineInventory.objects.count(), 2)
+
+    def test_stream_adds_up_repeats_across_batches(self):
+        self.import_inventory('--stream', '--batch-size', '1')
+        self.import_inventory('--stream', '--batch-size', '1')
+
+        self.assertEqual(self.lots(), [
+            ('Chablis', 'Burgundy', 6, Decimal('30.00')),
+            ('Romanee Conti', 'Burgundy', 4, Decimal('1275.00')),
+        ])
+        self.assertEqual(ImportSheet.objects.get(source='cellar').lot_count, 2)
+
+    def test_row_by_row_importer_adds_up_repeats(self):
+        call_command('import_inventory2', str(self.path), stdout=io.StringIO())
+        call_command('import_inventory2', str(self.path), stdout=io.StringIO())
+
+        self.assertEqual(self.lots(), [
+            ('Chablis', 'Burgundy', 6, Decimal('30.00')),
+            ('Romanee Conti', 'Burgundy', 4, Decimal('1275.00')),
+        ])
+
+    def test_non_finite_numbers_are_treated_as_missing(self):
+        write_workbook(self.path, [
+            ['BURGUNDY 勃艮第', None, None, None, None, None],
+            ['Romanee Conti', 'ROUGE', 'inf', '-inf', 3, '1e999'],
+            ['Chablis', 'BLANC', 2020, 75, 'inf', '30'],
+        ])
+
+        self.import_inventory('--bulk')
+
+        lot = WineInventory.objects.select_related('wine').get()
+        self.assertEqual((lot.wine.name, lot.wine.vintage, lot.bottle_size), ('Romanee Conti', '-', None))
+        self.assertEqual((lot.qty, lot.purchase_price), (3, Decimal('0')))
+
+    def test_non_finite_numbers_in_records_are_treated_as_missing(self):
+        records = pd.DataFrame({
+            'name': ['Romanee Conti', 'Chablis'], 'vintage': ['inf', '2020'], 'bottle_size': ['inf', '75'],
+            'qty': ['3', '-inf'], 'purchase_price': ['inf', '30'],
+        })
+
+        lots = importing.normalize_records(records, 'cellar')
+
+        self.assertEqual(lots[['name', 'vintage', 'bottle_size', 'qty', 'purchase_price']].values.tolist(), [
+            ['Romanee Conti', '-', None, 3, 0.0],
+        ])
+
+
+class InventoryApiTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('staff', password='secret')
+        self.client.force_login(user)
+        prices = [Decimal('50'), None, Decimal('20'), Decimal('50'), None, Decimal('80'), Decimal('20')]
+        self.lots = [make_lot(f'Wine {i}', purchase_price=price) for i, price in enumerate(prices)]
+
+    def fetch_all(self, sort, limit=2):
+        ids, cursor, pages = [], None, 0
+        while True:
+            params = {'sort': sort, 'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(reverse('inventory_api'), params)
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            ids += [row['id'] for row in payload['results']]
+            pages += 1
+            cursor = payload['next_cursor']
+            if cursor is None:
+                return ids, pages
+
+    def test_cursor_pages_cover_every_row_once(self):
+        for sort, descending in (('price', False), ('-price', True)):
+            with self.subTest(sort=sort):
+                priced = sorted(
+                    (lot for lot in self.lots if lot.purchase_price is not None),
+                    key=lambda lot: (lot.purchase_price, lot.pk), reverse=descending)
+                unpriced = sorted(
+                    (lot for lot in self.lots if lot.purchase_price is None),
+                    key=lambda lot: lot.pk, reverse=descending)
+
+                ids, pages = self.fetch_all(sort)
+
+                # NULLS LAST both ways, id as the tie-break
+                self.assertEqual(ids, [lot.pk for lot in priced + unpriced])
+                self.assertEqual(pages, 4)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(reverse('inventory_api'), {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'success': False, 'error': 'Invalid cursor.'})
+
+    def test_mistyped_cursor_is_rejected(self):
+        for sort, payload in [
+            ('qty', ['qty', 'abc', {'a': 1}]),
+            ('qty', ['qty', 1, 'zz']),
+            ('qty', ['qty', 'zz', 1]),
+            ('price', ['price', [1], 1]),
+            ('price', ['price', 'abc', 1]),
+            ('name', ['name', 'Margaux', True]),
+            ('name', 'name'),
+        ]:
+            with self.subTest(payload=payload):
+                cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+                response = self.client.get(reverse('inventory_api'), {'sort': sort, 'cursor': cursor})
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], 'Invalid cursor.')
+
+    def test_cursor_of_another_sort_is_rejected(self):
+        cursor = self.client.get(reverse('inventory_api'), {'sort': 'qty', 'limit': 1}).json()['next_cursor']
+
+        response = self.client.get(reverse('inventory_api'), {'sort': 'price', 'cursor': cursor})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Cursor does not match sort.')
+
+
+class WineListZipTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('staff', password='secret')
+        self.client.force_login(user)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = override_settings(WINE_LIST_PDF_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.wine_lists = []
+        for name in ('Client A', 'Client B'):
+            wine_list = WineList.objects.create(name=name)
+            WineItem.objects.create(
+                wine_list=wine_list, inventory=make_lot(f'{name} Margaux'), offer_price=Decimal('120'), offer_qty=3)
+            self.wine_lists.append(wine_list)
+
+    def test_zip_streams_one_pdf_per_list(self):
+        # One PDF cached beforehand, the other rendered on the pool
+        pdf.get_or_render(self.wine_lists[0], engine='reportlab')
+
+        response = self.client.post(reverse('export_wine_lists_zip'), {
+            'uuids': [str(wine_list.uuid) for wine_list in self.wine_lists] + ['not-a-uuid'],
+            'engine': 'reportlab',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['WineList_Client A.pdf', 'WineList_Client B.pdf'])
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+
+    def test_no_lists_selected(self):
+        response = self.client.post(reverse('export_wine_lists_zip'), {'uuids': ['not-a-uuid']})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'No wine lists selected.')
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('staff', password='secret')
+        self.client.force_login(user)
+        self.files_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.files_dir)
+        settings_override = override_settings(JOB_FILES_DIR=str(self.files_dir))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content, name='cellar.xlsx'):
+        upload = io.BytesIO(content)
+        upload.name = name
+        response = self.client.post(reverse('enqueue_job'), {'kind': 'import_inventory', 'file': upload})
+        self.assertEqual(response.status_code, 202)
+        return Job.objects.get(uuid=response.json()['job']['uuid'])
+
+    def run_next(self):
+        job = jobs.claim_next_job()
+        self.assertEqual(job.status, 'running')
+        return jobs.run_job(job)
+
+    def test_import_job_runs_the_upload(self):
+        path = self.files_dir / 'source.xlsx'
+        write_workbook(path, [['Chablis', 'BLANC', 2020, 75, 6, '30']])
+        queued = self.upload(path.read_bytes())
+        path.unlink()
+        self.assertEqual(queued.status, 'queued')
+        self.assertEqual(queued.params['source'], 'cellar')
+
+        job = self.run_next()
+
+        self.assertEqual((job.status, job.progress), ('succeeded', 100))
+        self.assertEqual(WineInventory.objects.get(source='cellar').qty, 6)
+        # The stored upload is removed once imported
+        self.assertEqual(list(self.files_dir.iterdir()), [])
+        status = self.client.get(reverse('job_status', args=[job.uuid])).json()['job']
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertIsNone(status['download_url'])
+
+    def test_unreadable_upload_fails_the_job(self):
+        self.upload(b'not a workbook')
+
+        job = self.run_next()
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Failed to read Excel file', job.error)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'failed')
+
+    def test_export_job_result_is_downloadable(self):
+        lot = make_lot('Margaux')
+        response = self.client.post(
+            reverse('enqueue_job'),
+            data=json.dumps({'kind': 'export_inventory', 'params': {'inventory_ids': [lot.pk]}}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+
+        job = self.run_next()
+        payload = self.client.get(reverse('job_status', args=[job.uuid])).json()['job']
+        download = self.client.get(payload['download_url'])
+
+        self.assertEqual(payload['result']['rows'], 1)
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(b''.join(download.streaming_content)[:2], b'PK')
+
+    def test_invalid_job_kinds_are_rejected(self):
+        for kind in ('import_inventory', 'unknown'):
+            with self.subTest(kind=kind):
+                response = self.client.post(
+                    reverse('enqueue_job'), data=json.dumps({'kind': kind}), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_jobs_are_claimed_oldest_first(self):
+        first = jobs.enqueue('export_inventory', inventory_ids=[])
+        second = jobs.enqueue('export_inventory', inventory_ids=[])
+
+        self.assertEqual(jobs.claim_next_job(), first)
+        self.assertEqual(jobs.claim_next_job(), second)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_only_jobs_without_a_heartbeat_are_requeued(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        dead = Job.objects.create(kind='export_inventory', status='running', started_at=long_ago,
+                                  heartbeat_at=long_ago, progress=40)
+        # Started as long ago, but its worker is still beating
+        alive = Job.objects.create(kind='export_inventory', status='running', started_at=long_ago,
+                                   heartbeat_at=timezone.now(), progress=40)
+
+        self.assertEqual(jobs.requeue_stale_jobs(timedelta(minutes=5)), 1)
+
+        dead.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((dead.status, dead.progress), ('queued', 0))
+        self.assertEqual(alive.status, 'running')
+
+    def test_progress_is_a_heartbeat(self):
+        job = Job.objects.create(kind='export_inventory', status='running',
+                                 heartbeat_at=timezone.now() - timedelta(hours=2))
+
+        jobs.set_progress(job, 50)
+
+        self.assertEqual(jobs.requeue_stale_jobs(timedelta(minutes=5)), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).progress, 50)
+
+    def test_expired_jobs_and_their_files_are_purged(self):
+        expired_file = self.files_dir / 'expired.xlsx'
+        recent_file = self.files_dir / 'recent.xlsx'
+        elsewhere = Path(tempfile.mkdtemp()) / 'mine.xlsx'
+        self.addCleanup(shutil.rmtree, elsewhere.parent)
+        for path in (expired_file, recent_file, elsewhere):
+            path.write_bytes(b'x')
+        Job.objects.create(kind='export_inventory', status='succeeded', result={'path': str(expired_file)},
+                           finished_at=timezone.now() - timedelta(days=8))
+        Job.objects.create(kind='import_inventory', status='failed', params={'file_path': str(elsewhere)},
+                           finished_at=timezone.now() - timedelta(days=8))
+        recent = Job.objects.create(kind='export_inventory', status='succeeded', result={'path': str(recent_file)},
+                                    finished_at=timezone.now())
+
+        self.assertEqual(jobs.purge_finished_jobs(timedelta(days=7)), 2)
+
+        self.assertEqual(list(Job.objects.all()), [recent])
+        self.assertFalse(expired_file.exists())
+        self.assertTrue(recent_file.exists())
+        # Only files of JOB_FILES_DIR are deleted
+        self.assertTrue(elsewhere.exists())
+
+
+class DedupeTests(TestCase):
+
+    def setUp(self):
+        self.wine_list = WineList.objects.create(name='Client A')
+
+    def lot(self, wine, qty, purchase_price, bottle_size=75):
+        return WineInventory.objects.create(wine=wine, qty=qty, purchase_price=purchase_price, bottle_size=bottle_size)
+
+    def test_finds_spellings_of_the_same_wine(self):
+        winner = Wine.objects.create(name='Château Margaux', vintage='2015')
+        loser = Wine.objects.create(name='Chateau Margaux', vintage='2015')
+        self.lot(winner, 6, Decimal('100'))
+        self.lot(winner, 1, Decimal('100'), bottle_size=150)
+        Wine.objects.create(name='Chateau Margaux', vintage='2016')
+        Wine.objects.create(name='Cuvee No 1', vintage='2015')
+        Wine.objects.create(name='Cuvee No 2', vintage='2015')
+
+        groups, stats = find_duplicates()
+
+        self.assertEqual(len(groups), 1)
+        # The wine with the most lots wins
+        self.assertEqual(groups[0]['winner'], (winner.pk, 'Château Margaux', '2015'))
+        self.assertEqual([loser_[:3] for loser_ in groups[0]['losers']], [(loser.pk, 'Chateau Margaux', '2015')])
+        self.assertEqual(stats['wines'], 5)
+
+    def test_merge_combines_lots_at_a_weighted_price(self):
+        winner = Wine.objects.create(name='Château Margaux', vintage='2015')
+        loser = Wine.objects.create(name='Chateau Margaux', vintage='2015')
+        kept = self.lot(winner, 2, Decimal('100'))
+        self.lot(winner, 1, Decimal('30'), bottle_size=37)
+        self.lot(loser, 6, Decimal('200'))
+        magnum = self.lot(loser, 1, Decimal('500'), bottle_size=150)
+
+        result = merge_duplicates(find_duplicates()[0])
+
+        self.assertEqual((result['merged'], result['combined'], result['skipped']), (1, 1, []))
+        self.assertFalse(Wine.objects.filter(pk=loser.pk).exists())
+        kept.refresh_from_db()
+        self.assertEqual((kept.qty, kept.purchase_price), (8, Decimal('175.00')))
+        magnum.refresh_from_db()
+        self.assertEqual((magnum.wine_id, magnum.qty, magnum.purchase_price), (winner.pk, 1, Decimal('500.00')))
+
+    def test_merge_skips_groups_with_listed_lots_to_combine(self):
+        winner = Wine.objects.create(name='Château Margaux', vintage='2015')
+        loser = Wine.objects.create(name='Chateau Margaux', vintage='2015')
+        self.lot(winner, 6, Decimal('100'))
+        self.lot(winner, 1, Decimal('100'), bottle_size=150)
+        listed = self.lot(loser, 2, Decimal('200'))
+        WineItem.objects.create(wine_list=self.wine_list, inventory=listed, offer_price=Decimal('250'), offer_qty=2)
+        groups = find_duplicates()[0]
+
+        result = merge_duplicates(groups)
+
+        self.assertEqual(result['skipped'], groups)
+        self.assertEqual(result['merged'], 0)
+        listed.refresh_from_db()
+        self.assertEqual((listed.wine_id, listed.qty), (loser.pk, 2))
+        self.assertEqual(WineInventory.objects.filter(wine=winner).count(), 2)
+
+
+class WineSearchTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret'))
+        self.margaux = Wine.objects.create(name='Château Margaux', vintage='2015', region='Bordeaux')
+        self.pavillon = Wine.objects.create(name='Pavillon Rouge du Chateau Margaux', vintage='2016',
+                                            region='Bordeaux')
+        self.chablis = Wine.objects.create(name='Chablis Les Clos', vintage='2020', region='Burgundy',
+                                           appellation='Chablis Grand Cru')
+
+    def search(self, query):
+        response = self.client.get(reverse('wine_search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_tolerates_typos_and_accents(self):
+        self.assertEqual(self.search('chateau margeaux')[0], self.margaux.pk)
+        self.assertIn(self.margaux.pk, self.search('CHÂTEAU MARGAUX'))
+        self.assertNotIn(self.chablis.pk, self.search('margaux'))
+
+    def test_matches_region_and_appellation(self):
+        self.assertEqual(self.search('burgundy'), [self.chablis.pk])
+        self.assertEqual(self.search('grand cru'), [self.chablis.pk])
+
+    def test_closest_match_ranks_first(self):
+        response = self.client.get(reverse('wine_search'), {'q': 'chateau margaux'})
+
+        results = response.json()['results']
+        self.assertEqual([result['id'] for result in results[:2]], [self.margaux.pk, self.pavillon.pk])
+        self.assertGreaterEqual(results[0]['score'], results[1]['score'])
+
+    def test_empty_query_finds_nothing(self):
+        self.assertEqual(self.search('  '), [])
+
+    def test_inventory_api_name_filter_uses_the_search(self):
+        lot = WineInventory.objects.create(wine=self.margaux, qty=6, bottle_size=75)
+        WineInventory.objects.create(wine=self.chablis, qty=6, bottle_size=75)
+
+        response = self.client.get(reverse('inventory_api'), {'name': 'margaus'})
+
+        self.assertEqual([row['id'] for row in response.json()['results']], [lot.pk])
+
+
+class BatchEditTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret'))
+        self.first = make_lot('Margaux')
+        self.magnum = WineInventory.objects.create(
+            wine=self.first.wine, purchase_price=Decimal('250'), qty=1, bottle_size=150)
+        self.untouched = make_lot('Pauillac')
+
+    def batch_edit(self, lots, **fields):
+        response = self.client.post(reverse('batch_edit_wines'), {
+            'selected_wines': ','.join(str(lot.pk) for lot in lots), **fields})
+        self.assertRedirects(response, reverse('inventory_list'), fetch_redirect_response=False)
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_updates_the_selected_lots_and_their_wines(self):
+        messages = self.batch_edit(
+            [self.first, self.magnum], region='Bordeaux', status='reserved', qty='2', purchase_price='oops')
+
+        self.assertEqual(messages, ['2 inventory items and 1 wines updated successfully.'])
+        for lot in (self.first, self.magnum):
+            lot.refresh_from_db()
+            self.assertEqual((lot.wine.region, lot.status, lot.qty), ('Bordeaux', 'reserved', 2))
+        # An unparsable price is skipped, not applied
+        self.assertEqual(self.first.purchase_price, Decimal('100'))
+        self.untouched.refresh_from_db()
+        self.assertEqual((self.untouched.wine.region, self.untouched.status), (None, 'in_stock'))
+
+    def test_vintage_change_moves_the_canonical_key(self):
+        self.batch_edit([self.first], vintage='2016')
+
+        wine = Wine.objects.get(pk=self.first.wine_id)
+        self.assertEqual(wine.vintage, '2016')
+        self.assertEqual(wine.canonical_key, canonical_key('Margaux', '2016'))
+
+    def test_nothing_to_apply(self):
+        self.assertEqual(self.batch_edit([self.first]), ['No changes were applied.'])
+
+
+class CreateWineListTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret'))
+        self.margaux = make_lot('Margaux')
+        self.pauillac = make_lot('Pauillac', purchase_price=Decimal('40'))
+
+    def create(self, items, name='Client A'):
+        return self.client.post(reverse('create_wine_list'), json.dumps({'name': name, 'items': items}),
+                                content_type='application/json')
+
+    def test_creates_the_list_with_its_totals(self):
+        response = self.create([
+            {'inventory_id': self.margaux.pk, 'offer_qty': 1},
+            {'inventory_id': self.pauillac.pk, 'offer_qty': '2'},
+            # Posted twice: the last entry wins
+            {'inventory_id': self.margaux.pk, 'offer_qty': 3},
+            {'inventory_id': 999999},
+            {'inventory_id': 'abc'},
+        ])
+
+        payload = response.json()
+        self.assertTrue(payload['success'])
+        self.assertEqual(sorted(payload['missing_ids'], key=str), [999999, 'abc'])
+        wine_list = WineList.objects.get(uuid=payload['uuid'])
+        self.assertEqual((wine_list.name, wine_list.status), ('Client A', 'created'))
+        self.assertEqual(
+            sorted(wine_list.items.values_list('inventory_id', 'offer_qty', 'offer_price')),
+            sorted([(self.margaux.pk, 3, Decimal('100')), (self.pauillac.pk, 2, Decimal('40'))]))
+        self.assertEqual((wine_list.item_count, wine_list.items_value), (2, Decimal('380')))
+
+    def test_invalid_quantities_are_rejected(self):
+        response = self.create([{'inventory_id': self.margaux.pk, 'offer_qty': 0}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['invalid_qty_ids'], [self.margaux.pk])
+        self.assertFalse(WineList.objects.exists())
+
+    def test_no_valid_items(self):
+        self.assertEqual(self.create([]).json()['error'], 'No items selected')
+        self.assertEqual(self.create([{'inventory_id': 999999}]).json()['error'], 'No valid items selected')
+        self.assertFalse(WineList.objects.exists())
+
+
+class ExportXlsxTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret'))
+
+    def test_exports_the_selected_lots(self):
+        pauillac = make_lot('Pauillac', purchase_price=Decimal('40'), qty=3, source='Negociant A')
+        margaux = make_lot('Margaux', purchase_price=None, purchase_date=date(2024, 3, 1))
+        make_lot('Chablis')
+
+        response = self.client.post(reverse('export_wines'), {'selected_wines': [pauillac.pk, margaux.pk]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('selected_wines.xlsx', response['Content-Disposition'])
+        worksheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(worksheet.values)
+        self.assertEqual(list(rows[0]), EXPORT_COLUMNS)
+        self.assertEqual(rows[1][:11], ('Margaux', 'Red', '2015', '—', 75, 0, 6, 'In Stock', 0, '—', '2024-03-01'))
+        self.assertEqual(rows[2][:11], ('Pauillac', 'Red', '2015', '—', 75, 40, 3, 'In Stock', 120, 'Negociant A', '—'))
+        self.assertEqual(len(rows), 3)
+
+    def test_get_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('export_wines')).status_code, 400)
+
+
+class WineListPdfTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret'))
+        self.cache_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(WINE_LIST_PDF_CACHE_DIR=str(self.cache_dir))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.wine_list = WineList.objects.create(name='Client A')
+        self.item = WineItem.objects.create(
+            wine_list=self.wine_list, inventory=make_lot('Margaux'), offer_price=Decimal('120'), offer_qty=3)
+        self.url = reverse('export_wine_list_pdf', args=[self.wine_list.uuid])
+
+    def get(self, **headers):
+        return self.client.get(self.url, {'engine': 'reportlab'}, **headers)
+
+    def cached_files(self):
+        return [path for path in self.cache_dir.rglob('*') if path.is_file()]
+
+    def test_pdf_is_rendered_once(self):
+        first = self.get()
+        body = b''.join(first.streaming_content)
+
+        second = self.get()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(body.startswith(b'%PDF'))
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(b''.join(second.streaming_content), body)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_unchanged_pdf_is_not_modified(self):
+        etag = self.get()['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_give_a_new_pdf(self):
+        etag = self.get()['ETag']
+        self.wine_list.amend_items([{'item_id': self.item.pk, 'accept_qty': 1}])
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotEqual(self.get(HTTP_ACCEPT_LANGUAGE='fr')['ETag'], response['ETag'])
+
+
+class ImportInventoryCsvTests(TestCase):
+    """Runs the COPY path on PostgreSQL and the pandas path elsewhere."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = Path(directory)
+
+    def load(self, name, content, *args):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        call_command('import_inventory_csv', str(path), *args, stdout=io.StringIO())
+
+    def lots(self):
+        return sorted(WineInventory.objects.values_list(
+            'wine__name', 'wine__vintage', 'wine__category', 'bottle_size', 'qty', 'purchase_price', 'purchase_date',
+            'source'))
+
+    def test_csv_rows_are_merged_into_lots(self):
+        csv_dump = (
+            "name,category,vintage,region,bottle_size,qty,purchase_price,purchase_date,source\n"
+            "Romanee Conti,ROUGE,2015,Burgundy,75,3,1200,2024-03-01,\n"
+            "Romanee Conti,red,2015,Burgundy,75,1,1500,2024-03-01,\n"
+            "Chablis,BLANC,NV,Burgundy,150,6,30,,Negociant A\n"
+            ",BLANC,2020,,75,6,30,,\n"
+            "Meursault,BLANC,2020,,75,lots,30,,\n"
+        )
+
+        self.load('cellar.csv', csv_dump)
+        self.load('cellar.csv', csv_dump)
+
+        self.assertEqual(self.lots(), [
+            ('Chablis', 'NV', 'white', 150, 6, Decimal('30.00'), None, 'Negociant A'),
+            ('Romanee Conti', '2015', 'red', 75, 4, Decimal('1275.00'), date(2024, 3, 1), 'cellar'),
+        ])
+        self.assertEqual(Wine.objects.count(), 2)
+
+    def test_jsonl(self):
+        self.load('dump.jsonl', '\n'.join(json.dumps(record) for record in [
+            {'name': 'Chablis', 'category': 'white', 'vintage': '2020', 'bottle_size': '75', 'qty': '6',
+             'purchase_price': '30'},
+            {'name': 'Chablis', 'category': 'white', 'vintage': '2020', 'bottle_size': '75', 'qty': '2',
+             'purchase_price': '34'},
+        ]) + '\n', '--source', 'auction')
+
+        self.assertEqual(self.lots(), [('Chablis', '2020', 'white', 75, 8, Decimal('31.00'), None, 'auction')])
+
+
+class SnapshotDiffTests(TestCase):
+
+    def test_lists_added_removed_and_changed_lots(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory) / 'cellar.xlsx'
+        workbook = Workbook()
+        sheets = {
+            '2024-03-01': [['Romanee Conti', 'ROUGE', 2015, 75, 3, '1200'], ['Chablis', 'BLANC', 2020, 75, 6, '30'],
+                           ['Meursault', 'BLANC', 2019, 75, 2, '80']],
+            '2024-04-01': [['Romanée-Conti', 'ROUGE', 2015, 75, 2, '1200'], ['Chablis', 'BLANC', 2020, 75, 6, '30'],
+                           ['Chablis', 'BLANC', 2020, 150, 1, '70'], ['Meursault', 'BLANC', 2019, 75, 2, '85']],
+        }
+        workbook.remove(workbook.active)
+        for title, rows in sheets.items():
+            worksheet = workbook.create_sheet(title)
+            worksheet.append(SHEET_HEADER)
+            for row in rows:
+                worksheet.append(row)
+        workbook.save(path)
+        out = io.StringIO()
+
+        call_command('diff_inventory_snapshots', str(path), '--processes', '1', stdout=out)
+
+        diff = json.loads(out.getvalue())
+        self.assertEqual((diff['old']['date'], diff['new']['date']), ('2024-03-01', '2024-04-01'))
+        self.assertEqual([(lot['name'], lot['bottle_size']) for lot in diff['added']], [('Chablis', 150)])
+        self.assertEqual(diff['removed'], [])
+        self.assertEqual(
+            [(lot['name'], lot['qty_change'], lot['purchase_price_new']) for lot in diff['changed']],
+            [('Meursault', 0, 85.0), ('Romanée-Conti', -1, 1200.0)])
+
+
+class SeedSyntheticTests(TestCase):
+
+    def seed(self, *args):
+        call_command('seed_synthetic', '--wines', '40', '--lists', '5', '--items-per-list', '4', *args,
+                     stdout=io.StringIO())
+
+    def catalogue(self):
+        return (
+            sorted(Wine.objects.values_list('name', 'vintage', 'category')),
+            sorted(WineInventory.objects.values_list('wine__name', 'bottle_size', 'qty', 'purchase_price')),
+            sorted(WineList.objects.values_list('uuid', 'item_count', 'items_value')),
+        )
+
+    def test_seeds_a_consistent_catalogue(self):
+        self.seed()
+
+        self.assertEqual(Wine.objects.count(), 40)
+        self.assertEqual(WineInventory.objects.count(), 120)
+        self.assertEqual(WineList.objects.count(), 5)
+        self.assertTrue(WineItem.objects.exists())
+        self.assertFalse(WineItem.objects.filter(offer_price__lt=F('inventory__purchase_price')).exists())
+        stored = sorted(WineList.objects.values_list('id', 'item_count', 'items_value'))
+        WineList.objects.refresh_totals()
+        self.assertEqual(sorted(WineList.objects.values_list('id', 'item_count', 'items_value')), stored)
+
+    def test_same_seed_same_data(self):
+        self.seed('--seed', '7')
+        first = self.catalogue()
+        WineList.objects.all().delete()
+        Wine.objects.all().delete()
+
+        self.seed('--seed', '7')
+
+        self.assertEqual(self.catalogue(), first)
+
+    def test_reloading_a_seed_fails(self):
+        self.seed()
+
+        with self.assertRaises(CommandError):
+            self.seed()
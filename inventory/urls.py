@@ -9,6 +9,8 @@ urlpatterns = [
     path('set-language/', views.set_language, name='set_language'),
 
     path('inventory/', views.inventory_list_view, name='inventory_list'),
+    path('inventory/api/', views.inventory_api_view, name='inventory_api'),
+    path('inventory/search/', views.wine_search_view, name='wine_search'),
     path('inventory/export/', views.export_wines, name='export_wines'),
     path('inventory/batch_edit/', views.batch_edit_wines, name='batch_edit_wines'),
 
@@ -16,7 +18,13 @@ urlpatterns = [
     path("winelist/", views.wine_list_index_view, name='wine_list_index'),
     path("winelist/create", views.create_wine_list, name="create_wine_list"),
     path("winelist/update-status/", views.update_wine_list_status, name="update_wine_list_status"),
+    path("winelist/export_zip/", views.export_wine_lists_zip, name="export_wine_lists_zip"),
     path("winelist/<uuid:uuid>/amend/", views.amend_wine_list, name='admin_amend_wine_list'),
     path("winelist/<uuid:uuid>/", views.wine_list_view, name="wine_list"),
     path("winelist/<uuid:uuid>/export_pdf/", views.export_wine_list_pdf, name="export_wine_list_pdf"),
+
+    # Background jobs (run by the run_workers command)
+    path("jobs/", views.enqueue_job, name="enqueue_job"),
+    path("jobs/<uuid:uuid>/", views.job_status, name="job_status"),
+    path("jobs/<uuid:uuid>/download/", views.job_download, name="job_download"),
 ]
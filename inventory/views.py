@@ -1,20 +1,36 @@
-import pandas as pd
+import base64
 import json
+import os
+import tempfile
 import uuid
+from decimal import Decimal, InvalidOperation
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.utils.translation import gettext as _
-from django.utils import translation
-from django.http import HttpResponse, JsonResponse
+from django.utils import timezone, translation
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse,
+                         StreamingHttpResponse)
+from django.utils.http import parse_etags
 
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
-from .models import Wine, WineInventory, STATUS_CHOICES, WineItem, WineList
+from . import jobs, pdf
+from .exports import stream_zip, write_inventory_xlsx
+from .models import Job, Wine, WineInventory, CATEGORY_CHOICES, STATUS_CHOICES, WineItem, WineList
+from .search import matching_wines, search_wines
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 
 
 def login_view(request):
@@ -43,14 +59,184 @@ def login_view(request):
 
 @login_required
 def inventory_list_view(request):
-    inventories = WineInventory.objects.select_related('wine').order_by('wine__name')
+    """
+    Renders the inventory table shell; rows are paged in from inventory_api_view.
+    """
     context = {
-        'inventories': inventories,
+        'CATEGORY_CHOICES': CATEGORY_CHOICES,
         'STATUS_CHOICES': STATUS_CHOICES,
     }
     return render(request, 'inventory/inventory_list.html', context)
 
 
+# Table column -> ORM field used for sorting the inventory API
+INVENTORY_SORT_FIELDS = {
+    'name': 'wine__name',
+    'vintage': 'wine__vintage',
+    'category': 'wine__category',
+    'region': 'wine__region',
+    'bottle_size': 'bottle_size',
+    'price': 'purchase_price',
+    'qty': 'qty',
+    'status': 'status',
+    'source': 'source',
+}
+
+INVENTORY_PAGE_SIZE = 100
+INVENTORY_MAX_PAGE_SIZE = 500
+
+
+def _encode_cursor(sort, value, pk):
+    payload = json.dumps([sort, value, pk], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _sort_model_field(path):
+    """Model field behind an INVENTORY_SORT_FIELDS path such as 'wine__name'."""
+    model = WineInventory
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def _decode_cursor(cursor, field):
+    """
+    (sort, value, pk) of a cursor, value converted to the type of the sort field.
+    Raises ValueError, TypeError or ValidationError when the cursor is malformed.
+    """
+    sort, value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(sort, str) or type(pk) is not int or isinstance(value, (dict, list)):
+        raise ValueError("Malformed cursor")
+    if value is not None:
+        value = _sort_model_field(field).to_python(value)
+    return sort, value, pk
+
+
+def _keyset_filter(field, value, pk, descending):
+    """
+    Q selecting the rows after (value, pk) in ORDER BY field [DESC] NULLS LAST, id [DESC].
+    """
+    op = 'lt' if descending else 'gt'
+    if value is None:
+        # Already inside the trailing NULL block: only the id tie-break remains
+        return Q(**{f'{field}__isnull': True, f'id__{op}': pk})
+    return (
+        Q(**{f'{field}__{op}': value})
+        | Q(**{field: value, f'id__{op}': pk})
+        | Q(**{f'{field}__isnull': True})
+    )
+
+
+@login_required
+def inventory_api_view(request):
+    """
+    JSON page of WineInventory rows with server-side filtering, sorting and keyset pagination.
+
+    Query params: name, category, status, sort (a table column, prefixed with '-' for
+    descending), limit and cursor (the next_cursor of the previous page).
+    """
+    sort = request.GET.get('sort') or 'name'
+    descending = sort.startswith('-')
+    field = INVENTORY_SORT_FIELDS.get(sort.lstrip('-'))
+    if field is None:
+        return JsonResponse({'success': False, 'error': 'Invalid sort column.'}, status=400)
+
+    try:
+        limit = min(int(request.GET.get('limit', INVENTORY_PAGE_SIZE)), INVENTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = INVENTORY_PAGE_SIZE
+    limit = max(limit, 1)
+
+    inventories = WineInventory.objects.all()
+
+    name = request.GET.get('name', '').strip()
+    category = request.GET.get('category')
+    status = request.GET.get('status')
+    if name:
+        inventories = inventories.filter(
+            Q(wine__name__icontains=name) | Q(wine__in=matching_wines(name)))
+    if category:
+        inventories = inventories.filter(wine__category=category)
+    if status:
+        inventories = inventories.filter(status=status)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            cursor_sort, value, pk = _decode_cursor(cursor, field)
+        except (ValueError, TypeError, ValidationError):
+            return JsonResponse({'success': False, 'error': 'Invalid cursor.'}, status=400)
+        if cursor_sort != sort:
+            return JsonResponse({'success': False, 'error': 'Cursor does not match sort.'}, status=400)
+        inventories = inventories.filter(_keyset_filter(field, value, pk, descending))
+
+    if descending:
+        ordering = [F(field).desc(nulls_last=True), F('id').desc()]
+    else:
+        ordering = [F(field).asc(nulls_last=True), F('id').asc()]
+
+    rows = list(
+        inventories.order_by(*ordering).values(
+            'id', 'bottle_size', 'purchase_price', 'qty', 'status', 'source',
+            'wine__name', 'wine__vintage', 'wine__category', 'wine__region',
+        )[:limit + 1]
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(sort, last[field], last['id'])
+
+    categories = dict(CATEGORY_CHOICES)
+    statuses = dict(STATUS_CHOICES)
+    results = [
+        {
+            'id': row['id'],
+            'name': row['wine__name'],
+            'vintage': row['wine__vintage'],
+            'category': row['wine__category'],
+            'category_display': categories.get(row['wine__category'], row['wine__category']),
+            'region': row['wine__region'],
+            'bottle_size': row['bottle_size'],
+            'price': row['purchase_price'],
+            'qty': row['qty'],
+            'status': row['status'],
+            'status_display': str(statuses.get(row['status'], row['status'])),
+            'source': row['source'],
+        }
+        for row in rows
+    ]
+
+    return JsonResponse({'success': True, 'results': results, 'next_cursor': next_cursor})
+
+
+@login_required
+def wine_search_view(request):
+    """
+    Ranked, typo- and accent-tolerant search over wine name, region and appellation.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+
+    results = [
+        {
+            'id': wine.id,
+            'name': wine.name,
+            'vintage': wine.vintage,
+            'region': wine.region,
+            'appellation': wine.appellation,
+            'score': round(float(wine.rank), 3),
+        }
+        for wine in search_wines(query, limit=limit)
+    ]
+    return JsonResponse({'success': True, 'results': results})
+
+
 def logout_view(request):
     """
     Logs out the user and redirects to the login page.
@@ -86,38 +272,18 @@ def set_language(request):
 def export_wines(request):
     if request.method == 'POST':
         selected_ids = request.POST.getlist('selected_wines')
-        wines = Wine.objects.filter(id__in=selected_ids)
-
-        data = []
-        for w in wines:
-            data.append({
-                'Name': w.name,
-                'Category': w.get_category_display(),
-                'Vintage': w.vintage or '—',
-                'Region': w.region or '—',
-                'Bottle Size (cl)': w.bottle_size or '—',
-                'Price (€)': float(w.purchase_price) if w.purchase_price else 0.0,
-                'Quantity': w.qty,
-                'Status': w.get_status_display(),
-                'Total (€)': (float(w.purchase_price) * w.qty) if w.purchase_price else 0.0,
-                'Source': w.source or '—',
-                'Purchase Date': w.purchase_date.strftime('%Y-%m-%d') if w.purchase_date else '—',
-                'Location': w.location or '—',
-                'Rating': w.rating or '—',
-                'Note': w.note or '',
-            })
-
-        df = pd.DataFrame(data)
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="selected_wines.xlsx"'
 
-        with pd.ExcelWriter(response, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Selected Wines', index=False)
+        # Spool the workbook to disk; FileResponse then streams it in blocks
+        xlsx_file = tempfile.TemporaryFile()
+        write_inventory_xlsx(selected_ids, xlsx_file)
+        xlsx_file.seek(0)
 
-        return response
+        return FileResponse(
+            xlsx_file,
+            as_attachment=True,
+            filename='selected_wines.xlsx',
+            content_type=XLSX_CONTENT_TYPE,
+        )
 
     return HttpResponse(status=400)
 
@@ -153,28 +319,31 @@ def batch_edit_wines(request):
                         continue
                 elif f == 'purchase_price':
                     try:
-                        val = float(val)
-                    except ValueError:
+                        val = Decimal(val)
+                    except InvalidOperation:
                         continue
                 inventory_updates[f] = val
 
-        # Apply updates
-        for inv in inventories:
-            # Update Wine definition if needed
+        # Apply updates as one UPDATE per table; shared Wines are written once
+        wines_updated = inventories_updated = 0
+        # update() bypasses auto_now, so stamp updated_at explicitly
+        now = timezone.now()
+        with transaction.atomic():
             if wine_updates:
-                wine = inv.wine
-                for k, v in wine_updates.items():
-                    setattr(wine, k, v)
-                wine.save()
-            # Update inventory-specific fields
+                wine_ids = inventories.values('wine_id').distinct()
+                wines_updated = Wine.objects.filter(id__in=wine_ids).update(**wine_updates)
+                if 'vintage' in wine_updates:
+                    Wine.objects.filter(id__in=wine_ids).refresh_canonical_keys()
+                # Wine has no timestamp: every lot of an edited wine is stamped, so the
+                # client pages listing any of them see the change (client_portal._page_version)
+                WineInventory.objects.filter(wine_id__in=wine_ids).update(updated_at=now)
             if inventory_updates:
-                for k, v in inventory_updates.items():
-                    setattr(inv, k, v)
-                inv.save()
+                inventories_updated = inventories.update(**inventory_updates, updated_at=now)
 
         if wine_updates or inventory_updates:
             messages.success(
-                request, f"{len(inventories)} inventory items updated successfully.")
+                request,
+                f"{inventories_updated} inventory items and {wines_updated} wines updated successfully.")
         else:
             messages.info(request, "No changes were applied.")
 
@@ -183,6 +352,15 @@ def batch_edit_wines(request):
     return redirect('inventory_list')
 
 
+def _positive_int(value):
+    """`value` (an int or a digit string) as an int >= 1, or None."""
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        return None
+    return number if number > 0 else None
+
+
 @login_required
 @csrf_exempt
 @require_POST
@@ -196,25 +374,54 @@ def create_wine_list(request):
     if not items:
         return JsonResponse({"success": False, "error": "No items selected"})
 
-    # create wine list with UUID
-    wine_list = WineList.objects.create(
-        uuid=uuid.uuid4(), name=name, description=description, status="created")
-
+    # Last entry wins if the same inventory is posted twice (unique per list)
+    offer_qtys = {}
+    missing_ids = []
+    invalid_qty_ids = []
     for it in items:
         inventory_id = it.get("inventory_id")
-        offer_qty = it.get("offer_qty", 1)
         try:
-            inventory = WineInventory.objects.get(id=inventory_id)
-            WineItem.objects.create(
+            inventory_id = int(inventory_id)
+        except (TypeError, ValueError):
+            missing_ids.append(inventory_id)
+            continue
+        offer_qty = _positive_int(it.get("offer_qty", 1))
+        if offer_qty is None:
+            invalid_qty_ids.append(inventory_id)
+        else:
+            offer_qtys[inventory_id] = offer_qty
+
+    if invalid_qty_ids:
+        return JsonResponse({"success": False, "error": "offer_qty must be a positive whole number",
+                             "invalid_qty_ids": invalid_qty_ids}, status=400)
+
+    with transaction.atomic():
+        inventories = WineInventory.objects.only("id", "purchase_price").in_bulk(list(offer_qtys))
+        missing_ids += [inventory_id for inventory_id in offer_qtys if inventory_id not in inventories]
+        if not inventories:
+            return JsonResponse({"success": False, "error": "No valid items selected",
+                                 "missing_ids": missing_ids})
+
+        wine_items = [
+            WineItem(
                 inventory=inventory,
-                wine_list=wine_list,
-                offer_qty=offer_qty,
+                offer_qty=offer_qtys[inventory_id],
                 offer_price=inventory.purchase_price  # or your logic
             )
-        except WineInventory.DoesNotExist:
-            continue
+            for inventory_id, inventory in inventories.items()
+        ]
+
+        # create wine list with UUID; bulk_create skips signals, so set its totals here
+        wine_list = WineList.objects.create(
+            uuid=uuid.uuid4(), name=name, description=description, status="created",
+            item_count=len(wine_items),
+            items_value=sum(item.line_value() for item in wine_items))
+
+        for item in wine_items:
+            item.wine_list = wine_list
+        WineItem.objects.bulk_create(wine_items)
 
-    return JsonResponse({"success": True, "uuid": str(wine_list.uuid)})
+    return JsonResponse({"success": True, "uuid": str(wine_list.uuid), "missing_ids": missing_ids})
 
 
 @login_required
@@ -224,8 +431,7 @@ def wine_list_index_view(request):
     """
     wine_lists = (
         WineList.objects.exclude(status__in=["archived"])
-        .prefetch_related("items")  # optimize item count queries
-        .order_by("-created_at")
+        .order_by("-created_at")  # item totals are stored on the list itself
     )
 
     context = {
@@ -237,7 +443,7 @@ def wine_list_index_view(request):
 def wine_list_view(request, uuid):
     wine_list = get_object_or_404(
         WineList.objects.exclude(status='archived'), uuid=uuid)
-    items = wine_list.items.all()
+    items = wine_list.items.select_related('inventory__wine')
 
     return render(request, "inventory/wine_list.html", {
         "wine_list": wine_list,
@@ -251,11 +457,6 @@ def amend_wine_list(request, uuid):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Invalid method"}, status=405)
 
-    wine_list = get_object_or_404(WineList, uuid=uuid)
-
-    if wine_list.status != "created":
-        return JsonResponse({"success": False, "error": "Wine list has already been submitted"}, status=400)
-
     try:
         data = json.loads(request.body)
         items_data = data.get("items", [])
@@ -265,25 +466,16 @@ def amend_wine_list(request, uuid):
     if not items_data:
         return JsonResponse({"success": False, "error": "No items provided"}, status=400)
 
-    # Update each item
-    for item_info in items_data:
-        item_id = item_info.get("item_id")
-        offer_price = item_info.get("offer_price", 0)
-        accept_qty = item_info.get("accept_qty", 0)
+    with transaction.atomic():
+        # Lock the list so a concurrent submit cannot interleave with the amendment
+        wine_list = get_object_or_404(WineList.objects.select_for_update(), uuid=uuid)
 
-        if not item_id or accept_qty < 0:
-            continue  # skip invalid
+        if wine_list.status != "created":
+            return JsonResponse({"success": False, "error": "Wine list has already been submitted"}, status=400)
 
-        try:
-            wine_item = WineItem.objects.get(id=item_id, wine_list=wine_list)
-            wine_item.offer_price = max(offer_price, wine_item.inventory.purchase_price)  # not below purchase
-            wine_item.accept_qty = min(accept_qty, wine_item.offer_qty)  # don't exceed offer
-            wine_item.save()
-        except WineItem.DoesNotExist:
-            continue  # skip missing
-
-    # Update wine list status
-    wine_list.save()
+        wine_list.amend_items(items_data, prices=True)
+        # Only bump updated_at: the stored totals were just shifted in the database
+        wine_list.save(update_fields=["updated_at"])
     return JsonResponse({"success": True})
 
 
@@ -303,7 +495,8 @@ def update_wine_list_status(request):
         if status not in valid_statuses:
             return JsonResponse({'success': False, 'error': 'Invalid status.'}, status=400)
 
-        updated = WineList.objects.filter(uuid__in=uuids).update(status=status)
+        # Move updated_at too: it versions the cached client pages
+        updated = WineList.objects.filter(uuid__in=uuids).update(status=status, updated_at=timezone.now())
 
         return JsonResponse({'success': True, 'updated_count': updated})
     except Exception as e:
@@ -313,55 +506,146 @@ def update_wine_list_status(request):
 @csrf_exempt
 @login_required
 def export_wine_list_pdf(request, uuid):
-    from weasyprint import HTML
-    import io
-
     # Get the wine list
     wine_list = get_object_or_404(
         WineList.objects.exclude(status='archived'), uuid=uuid)
-    items = wine_list.items.all()  # adjust if you use related_name
-
-    # Build a pandas DataFrame
-    data = []
-    for item in items:
-        data.append({
-            "Name": item.inventory.wine.name,
-            "Vintage": item.inventory.wine.vintage or "",
-            "Category": item.inventory.wine.category,
-            "Region": item.inventory.wine.region or "",
-            "Bottle Size (cl)": item.inventory.bottle_size,
-            "Qty": item.accept_qty or item.offer_qty,
-            "Note": item.note or "",
-        })
-    df = pd.DataFrame(data)
-
-    # Convert DataFrame to HTML
-    html_content = df.to_html(index=False, border=0, justify='left')
-
-    # Optional: Wrap HTML in a minimal template
-    html = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            table {{ border-collapse: collapse; width: 100%; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; font-size: 12px; }}
-            th {{ background-color: #f2f2f2; }}
-        </style>
-    </head>
-    <body>
-        <h2>Wine List: {wine_list.name or wine_list.uuid}</h2>
-        {html_content}
-    </body>
-    </html>
-    """
 
-    # Generate PDF
-    pdf_file = io.BytesIO()
-    HTML(string=html).write_pdf(pdf_file)
-    pdf_file.seek(0)
+    engine = pdf.resolve_engine(request.GET.get('engine'))
+    language = translation.get_language()
+    rows = pdf.wine_list_rows(wine_list)
+    key = pdf.cache_key(wine_list, rows, engine, language)
+    etag = f'"{key}"'
+
+    # Content-addressed: an unchanged ETag means the client already has this exact PDF
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    path = pdf.get_or_render(wine_list, rows, key, engine, language)
 
     # Return PDF as response
-    response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="WineList_{wine_list.name or wine_list.uuid}.pdf"'
+    response = FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=pdf.pdf_filename(pdf.wine_list_title(wine_list)),
+        content_type='application/pdf',
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+
+@login_required
+@require_POST
+def export_wine_lists_zip(request):
+    """
+    Stream one ZIP holding the PDF of every selected wine list.
+
+    Cached PDFs go out first; the rest render in parallel on the bounded PDF
+    process pool and are appended as they finish.
+    """
+    uuids = []
+    for value in request.POST.getlist('uuids'):
+        try:
+            uuids.append(uuid.UUID(value))
+        except ValueError:
+            continue
+
+    wine_lists = list(WineList.objects.exclude(status='archived').filter(uuid__in=uuids))
+    if not wine_lists:
+        return JsonResponse({'success': False, 'error': 'No wine lists selected.'}, status=400)
+
+    def entries():
+        used = set()
+        for wine_list, path in pdf.get_or_render_many(
+                wine_lists, request.POST.get('engine'), translation.get_language()):
+            title = pdf.wine_list_title(wine_list)
+            arcname = pdf.pdf_filename(title)
+            if arcname in used:
+                arcname = pdf.pdf_filename(f"{title}_{wine_list.uuid}")
+            used.add(arcname)
+            yield arcname, path
+
+    response = StreamingHttpResponse(stream_zip(entries()), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="WineLists.zip"'
     return response
+
+# Job kinds whose input is an uploaded file rather than JSON params
+UPLOAD_JOB_KINDS = {'import_inventory'}
+
+
+def _job_payload(job):
+    result = dict(job.result or {})
+    download_url = None
+    if result.pop('path', None):
+        download_url = reverse('job_download', args=[job.uuid])
+    return {
+        'uuid': str(job.uuid),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'result': result,
+        'error': job.error,
+        'download_url': download_url,
+        'status_url': reverse('job_status', args=[job.uuid]),
+    }
+
+
+@login_required
+@csrf_exempt
+@require_POST
+def enqueue_job(request):
+    """
+    Queue background work for run_workers and return at once.
+
+    Accepts JSON {"kind": ..., "params": {...}}, or a multipart upload with
+    "kind" and "file" for import jobs.
+    """
+    if request.FILES:
+        kind = request.POST.get('kind', 'import_inventory')
+        upload = request.FILES.get('file')
+        if kind not in UPLOAD_JOB_KINDS or upload is None:
+            return JsonResponse({'success': False, 'error': 'Invalid upload.'}, status=400)
+        path = jobs.job_files_dir() / f"{uuid.uuid4()}_{os.path.basename(upload.name)}"
+        with open(path, 'wb') as destination:
+            for chunk in upload.chunks():
+                destination.write(chunk)
+        # Lots are keyed on their source: name it after the upload, not the stored copy
+        params = {'file_path': str(path), 'source': os.path.splitext(os.path.basename(upload.name))[0]}
+    else:
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        kind = data.get('kind')
+        params = data.get('params') or {}
+        if kind in UPLOAD_JOB_KINDS or kind not in jobs.JOB_HANDLERS or not isinstance(params, dict):
+            return JsonResponse({'success': False, 'error': 'Invalid job kind.'}, status=400)
+
+    job = jobs.enqueue(kind, **params)
+    return JsonResponse({'success': True, 'job': _job_payload(job)}, status=202)
+
+
+@login_required
+@require_GET
+def job_status(request, uuid):
+    job = get_object_or_404(Job, uuid=uuid)
+    return JsonResponse({'success': True, 'job': _job_payload(job)})
+
+
+@login_required
+@require_GET
+def job_download(request, uuid):
+    job = get_object_or_404(Job, uuid=uuid, status='succeeded')
+    result = job.result or {}
+    path = result.get('path')
+    if not path or not os.path.exists(path):
+        raise Http404("Job has no downloadable result.")
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=result.get('filename') or os.path.basename(path),
+        content_type=result.get('content_type'),
+    )
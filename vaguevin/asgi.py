@@ -2,6 +2,8 @@
 ASGI config for vaguevin project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+As in vaguevin/wsgi.py, client portal requests are served through the lean
+CLIENT_PORTAL_MIDDLEWARE stack, everything else through the full MIDDLEWARE.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -11,6 +13,29 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from vaguevin.handlers import LeanASGIHandler, is_client_portal_path
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vaguevin.settings")
 
-application = get_asgi_application()
+
+class PathDispatcher:
+    """Send client portal HTTP requests to `client_portal` and the rest to `default`."""
+
+    def __init__(self, default, client_portal):
+        self.default = default
+        self.client_portal = client_portal
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and is_client_portal_path(scope.get("path", "")):
+            return await self.client_portal(scope, receive, send)
+        return await self.default(scope, receive, send)
+
+
+def get_application():
+    from django.conf import settings
+
+    default = get_asgi_application()  # sets Django up
+    return PathDispatcher(default, LeanASGIHandler(settings.CLIENT_PORTAL_MIDDLEWARE))
+
+
+application = get_application()
@@ -0,0 +1,46 @@
+"""
+Request handlers serving the client portal through the lean
+CLIENT_PORTAL_MIDDLEWARE stack; vaguevin/wsgi.py and vaguevin/asgi.py send
+client portal paths to them and everything else to Django's own handlers.
+"""
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+# Paths of the client_portal URLconf (see vaguevin/urls.py)
+CLIENT_PORTAL_PREFIXES = ("/winelist/",)
+
+
+def is_client_portal_path(path):
+    return path == "/" or path.startswith(CLIENT_PORTAL_PREFIXES)
+
+
+class LeanHandlerMixin:
+    """
+    Builds the middleware chain from `middleware_classes` rather than
+    settings.MIDDLEWARE. BaseHandler.load_middleware does the building; it only
+    sees the other list while the handler is constructed, so the full-stack
+    handlers serving the other paths are unaffected.
+    """
+
+    middleware_classes = ()
+
+    def __init__(self, middleware):
+        self.middleware_classes = middleware
+        super().__init__()
+
+    def load_middleware(self, is_async=False):
+        full_stack = settings.MIDDLEWARE
+        settings.MIDDLEWARE = self.middleware_classes
+        try:
+            super().load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = full_stack
+
+
+class LeanWSGIHandler(LeanHandlerMixin, WSGIHandler):
+    """A WSGIHandler that runs `middleware` instead of settings.MIDDLEWARE."""
+
+
+class LeanASGIHandler(LeanHandlerMixin, ASGIHandler):
+    """An ASGIHandler that runs `middleware` instead of settings.MIDDLEWARE."""
@@ -0,0 +1,137 @@
+import brotli
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.middleware.locale import LocaleMiddleware
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+
+# Dynamic responses: quality 4-5 compresses better than gzip -6 at a similar speed
+BROTLI_QUALITY = 5
+
+# Already-compressed payloads (PDF, ZIP, XLSX, images) are left alone
+COMPRESSIBLE_TYPES = {'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'}
+
+
+def accepted_encoding(header):
+    """'br', 'gzip' or None: the best coding an Accept-Encoding header allows."""
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    offered = {coding: weights.get(coding, weights.get('*', 0.0)) for coding in ('br', 'gzip')}
+    # Highest q wins; max() keeps the first of equals, so ties go to br
+    best = max(offered, key=offered.get)
+    return best if offered[best] > 0 else None
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    return (
+        media_type.startswith('text/')
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith(('+json', '+xml'))
+    )
+
+
+def brotli_sequence(sequence):
+    """Brotli-compress an iterable of chunks, flushing after each so streams keep flowing."""
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that prefers brotli when the client accepts it and skips
+    media types that are already compressed. Streaming responses are
+    compressed chunk by chunk.
+    """
+
+    def process_response(self, request, response):
+        if not is_compressible(response.get('Content-Type', '')):
+            return response
+        coding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+        if coding == 'gzip':
+            return super().process_response(request, response)
+
+        # Same rules as GZipMiddleware from here, with brotli
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.streaming:
+            if response.is_async:
+                original_iterator = response.streaming_content
+
+                async def brotli_wrapper():
+                    # One compressor for the whole body: brotli streams cannot be concatenated
+                    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+                    async for chunk in original_iterator:
+                        data = compressor.process(chunk) + compressor.flush()
+                        if data:
+                            yield data
+                    yield compressor.finish()
+
+                response.streaming_content = brotli_wrapper()
+            else:
+                response.streaming_content = brotli_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed_content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class ClientLocaleMiddleware(LocaleMiddleware):
+    """
+    LocaleMiddleware for the session-less client portal: a ?lang= in the URL
+    wins and is remembered in the language cookie; otherwise the cookie, then
+    Accept-Language, as usual.
+    """
+
+    def requested_language(self, request):
+        code = request.GET.get('lang')
+        if not code:
+            return None
+        try:
+            return translation.get_supported_language_variant(code)
+        except LookupError:
+            return None
+
+    def process_request(self, request):
+        language = self.requested_language(request)
+        if language is None:
+            return super().process_request(request)
+        translation.activate(language)
+        request.LANGUAGE_CODE = translation.get_language()
+
+    def process_response(self, request, response):
+        response = super().process_response(request, response)
+        language = self.requested_language(request)
+        if language and request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME) != language:
+            # Same cookie as inventory's set_language view
+            response.set_cookie(settings.LANGUAGE_COOKIE_NAME, language, max_age=31536000, samesite='Lax')
+        return response
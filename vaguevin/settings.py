@@ -42,11 +42,13 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "inventory",
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'vaguevin.middleware.CompressionMiddleware',             # brotli/gzip; before anything that edits the body
     'django.contrib.sessions.middleware.SessionMiddleware',  # MUST be first
     'django.middleware.locale.LocaleMiddleware',             # MUST be second
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +58,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# The anonymous client portal (/ and /winelist/...) skips sessions, auth,
+# messages and CSRF; vaguevin/wsgi.py and vaguevin/asgi.py route it through this stack
+CLIENT_PORTAL_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'vaguevin.middleware.CompressionMiddleware',
+    'vaguevin.middleware.ClientLocaleMiddleware',            # ?lang=, then the language cookie
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
 ROOT_URLCONF = "vaguevin.urls"
 
 TEMPLATES = [
@@ -143,6 +155,31 @@ USE_TZ = True
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
 
+# Rendered wine list PDFs, content-addressed (see inventory/pdf_cache.py)
+WINE_LIST_PDF_CACHE_DIR = config('WINE_LIST_PDF_CACHE_DIR', default=os.path.join(BASE_DIR, 'pdf_cache'))
+WINE_LIST_PDF_CACHE_MAX_BYTES = config('WINE_LIST_PDF_CACHE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+WINE_LIST_PDF_CACHE_MAX_AGE = config('WINE_LIST_PDF_CACHE_MAX_AGE', default=7 * 24 * 3600, cast=int)  # seconds
+# "weasyprint" (HTML/CSS layout) or "reportlab" (direct drawing, faster on long lists)
+WINE_LIST_PDF_ENGINE = config('WINE_LIST_PDF_ENGINE', default='weasyprint')
+# Per web process: bounds concurrent PDF renders for multi-list ZIP exports
+WINE_LIST_PDF_RENDER_PROCESSES = config('WINE_LIST_PDF_RENDER_PROCESSES', default=2, cast=int)
+
+# Point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached to share the cache between processes
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='vaguevin'),
+    }
+}
+# Rendered client wine list pages, per uuid and language (see client_portal/views.py)
+CLIENT_PAGE_CACHE_SECONDS = config('CLIENT_PAGE_CACHE_SECONDS', default=300, cast=int)
+
+# Background jobs (see inventory/jobs.py and the run_workers command)
+JOB_FILES_DIR = config('JOB_FILES_DIR', default=os.path.join(BASE_DIR, 'job_files'))
+JOB_WORKER_PROCESSES = config('JOB_WORKER_PROCESSES', default=2, cast=int)
+# Finished jobs and their files in JOB_FILES_DIR are deleted after this long
+JOB_FILES_MAX_AGE = config('JOB_FILES_MAX_AGE', default=7 * 24 * 3600, cast=int)  # seconds
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
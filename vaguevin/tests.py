@@ -0,0 +1,173 @@
+import gzip
+import io
+from decimal import Decimal
+
+import brotli
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from inventory.models import Wine, WineInventory, WineItem, WineList
+from vaguevin import wsgi
+from vaguevin.middleware import CompressionMiddleware, accepted_encoding
+
+BODY = b'<tr><td>Chateau Margaux 2015</td><td>75</td><td>6</td></tr>\n' * 50
+
+
+class AcceptedEncodingTests(SimpleTestCase):
+
+    def test_prefers_brotli(self):
+        self.assertEqual(accepted_encoding('gzip, deflate, br'), 'br')
+
+    def test_highest_quality_wins(self):
+        self.assertEqual(accepted_encoding('br;q=0.1, gzip;q=1'), 'gzip')
+        self.assertEqual(accepted_encoding('br;q=0.9, gzip;q=0.5'), 'br')
+
+    def test_ties_go_to_brotli(self):
+        self.assertEqual(accepted_encoding('gzip;q=0.5, br;q=0.5'), 'br')
+
+    def test_wildcard_and_refusals(self):
+        self.assertEqual(accepted_encoding('*'), 'br')
+        self.assertEqual(accepted_encoding('br;q=0, *'), 'gzip')
+        self.assertIsNone(accepted_encoding('br;q=0, gzip;q=0'))
+        self.assertIsNone(accepted_encoding('identity'))
+        self.assertIsNone(accepted_encoding(''))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def respond(self, response, accept_encoding):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_brotli(self):
+        response = self.respond(HttpResponse(BODY), 'gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(brotli.decompress(response.content), BODY)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    def test_gzip_when_preferred(self):
+        response = self.respond(HttpResponse(BODY), 'br;q=0.1, gzip;q=1')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_refused_codings_are_not_used(self):
+        response = self.respond(HttpResponse(BODY), 'br;q=0, gzip;q=0')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, BODY)
+
+    def test_compressed_media_is_left_alone(self):
+        response = self.respond(HttpResponse(BODY, content_type='application/pdf'), 'br')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, BODY)
+
+    def test_strong_etag_becomes_weak(self):
+        original = HttpResponse(BODY)
+        original['ETag'] = '"abc"'
+
+        self.assertEqual(self.respond(original, 'br')['ETag'], 'W/"abc"')
+
+    def test_brotli_stream(self):
+        chunks = [BODY[:100], BODY[100:1000], BODY[1000:]]
+        response = self.respond(StreamingHttpResponse(iter(chunks)), 'br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertFalse(response.has_header('Content-Length'))
+        compressed = list(response.streaming_content)
+        # Flushed per chunk: the client gets data as the view produces it
+        self.assertGreaterEqual(len(compressed), len(chunks))
+        self.assertEqual(brotli.decompress(b''.join(compressed)), BODY)
+
+    def test_gzip_stream(self):
+        response = self.respond(StreamingHttpResponse(iter([BODY[:100], BODY[100:]])), 'gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), BODY)
+
+    async def test_async_brotli_stream(self):
+        async def chunks():
+            yield BODY[:100]
+            yield BODY[100:]
+
+        response = self.respond(StreamingHttpResponse(chunks()), 'br')
+
+        compressed = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(brotli.decompress(b''.join(compressed)), BODY)
+
+
+class WSGIApplicationTests(TestCase):
+    """vaguevin.wsgi's application, called directly as a WSGI server would."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.application = wsgi.get_application()
+
+    def setUp(self):
+        wine = Wine.objects.create(name='Margaux', vintage='2015', category='red')
+        lot = WineInventory.objects.create(wine=wine, purchase_price=Decimal('100'), qty=6, bottle_size=75)
+        self.wine_list = WineList.objects.create(name='Client A')
+        WineItem.objects.create(wine_list=self.wine_list, inventory=lot, offer_price=Decimal('120'), offer_qty=3)
+        # A staff member's session cookie, which the full stack would load
+        self.client.force_login(get_user_model().objects.create_user('staff', password='secret'))
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def call(self, path):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80', 'HTTP_HOST': 'testserver', 'HTTP_COOKIE': self.cookie,
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        }
+        started = {}
+
+        def start_response(status, headers):
+            started.update(status=int(status.split()[0]), headers=dict(headers))
+
+        # As django.test.Client does: closing the connection would end the test's transaction
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            response = self.application(environ, start_response)
+            body = b''.join(response)
+            response.close()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        return started['status'], started['headers'], body
+
+    def test_client_portal_skips_sessions(self):
+        with CaptureQueriesContext(connection) as queries:
+            status, headers, body = self.call(f'/winelist/{self.wine_list.uuid}/')
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'Margaux', body)
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+        self.assertNotIn('Cookie', headers.get('Vary', ''))
+
+    def test_client_portal_sets_no_cookies(self):
+        # The full stack's CSRF middleware would set csrftoken for the index form
+        status, headers, _ = self.call('/')
+
+        self.assertEqual(status, 200)
+        self.assertNotIn('Set-Cookie', headers)
+        self.assertNotIn('Cookie', headers.get('Vary', ''))
+
+    def test_other_paths_get_the_full_stack(self):
+        with CaptureQueriesContext(connection) as queries:
+            status, _, body = self.call('/admin/inventory/')
+
+        self.assertEqual(status, 200)  # logged in through the session and auth middleware
+        self.assertTrue([query for query in queries if 'django_session' in query['sql']])
+
+    def test_full_stack_setting_is_untouched(self):
+        self.assertIn('django.contrib.sessions.middleware.SessionMiddleware', settings.MIDDLEWARE)
+        self.assertEqual(self.application.client_portal.middleware_classes, settings.CLIENT_PORTAL_MIDDLEWARE)
@@ -2,6 +2,8 @@
 WSGI config for vaguevin project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Client portal requests are served through the lean CLIENT_PORTAL_MIDDLEWARE
+stack, everything else through the full MIDDLEWARE.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
@@ -11,6 +13,29 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from vaguevin.handlers import LeanWSGIHandler, is_client_portal_path
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vaguevin.settings")
 
-application = get_wsgi_application()
+
+class PathDispatcher:
+    """Send client portal paths to `client_portal` and the rest to `default`."""
+
+    def __init__(self, default, client_portal):
+        self.default = default
+        self.client_portal = client_portal
+
+    def __call__(self, environ, start_response):
+        if is_client_portal_path(environ.get("PATH_INFO", "")):
+            return self.client_portal(environ, start_response)
+        return self.default(environ, start_response)
+
+
+def get_application():
+    from django.conf import settings
+
+    default = get_wsgi_application()  # sets Django up
+    return PathDispatcher(default, LeanWSGIHandler(settings.CLIENT_PORTAL_MIDDLEWARE))
+
+
+application = get_application()